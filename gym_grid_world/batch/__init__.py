@@ -0,0 +1,4 @@
+from .eat_bullet import EatBulletBatchEnv, EatBulletMemBatchEnv
+from .pickput import PickputBatchEnv
+from .push_block import PushBlockBatchEnv
+from .subproc import SubprocVecEnv
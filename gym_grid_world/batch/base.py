@@ -0,0 +1,215 @@
+import numpy as np
+from typing import Tuple
+
+from gym import spaces
+from gym.utils import seeding
+
+from ..envs.grid import MoveNames, get_next_cell, gather_views
+
+
+class BatchGridEnv:
+    '''
+    Abstract class for grid environments which step a batch of games at once
+
+    Positions are kept as integer cell ids (x * grid_height + y) in one row
+    per env, and map_cell gives their index in the flattened feature maps.
+    '''
+    def __init__(self, num_envs: int) -> None:
+        self.num_envs = num_envs
+        self.seed()
+        self._is_configured = False
+
+    def configure(self, actions,
+                  grid_size: Tuple[int, int],
+                  n_features: int,
+                  *, max_step=-1,
+                  center=False, view_radius=(0, 0),
+                  obs_pool=0):
+        '''
+        obs_pool: write the observations into a ring of this many buffers,
+            so the last obs_pool observations stay valid without copies
+        '''
+        self.grid_size = grid_size
+        self.cell_n = grid_size[0] * grid_size[1]
+        self.n_features = n_features
+        self.max_step = max_step
+        self.step_cnt = np.zeros(self.num_envs, dtype=np.int64)
+
+        self.actions = actions
+        self.action_space = spaces.Discrete(len(actions))
+        self.next_cell = get_next_cell(tuple(grid_size), tuple(actions))
+        self.is_move = np.array([name in MoveNames for name in actions])
+
+        # in center mode the maps have a permanent zero border of
+        # view_radius cells, like GridEnv
+        self.center = center
+        rx, ry = view_radius if center else (0, 0)
+        w, h = grid_size
+        pw, ph = w + 2*rx, h + 2*ry
+        self.padded_map = np.zeros((self.num_envs, pw, ph, n_features),
+                                   dtype=np.float32)
+        self.feature_map = self.padded_map[:, rx:rx+w, ry:ry+h]
+        self.flat_map = self.padded_map.reshape(
+            (self.num_envs, pw * ph, n_features))
+        x, y = self.cell_to_pos(np.arange(self.cell_n))
+        self.map_cell = (x + rx) * ph + (y + ry)
+        # the last channel marks the inside of the map and never changes
+        self.feature_map[..., -1] = 1
+
+        if center:
+            self.obs_size = (2*rx + 1, 2*ry + 1)
+            self.obs_map = np.zeros((self.num_envs, *self.obs_size,
+                                     n_features), dtype=np.float32)
+        else:
+            self.obs_size = grid_size
+            self.obs_map = self.feature_map
+        self.observation_space = spaces.Box(0., 1., self.obs_map.shape[1:],
+                                            np.float32)
+        self.obs_pool = obs_pool
+        self._pool = np.zeros((obs_pool, *self.obs_map.shape),
+                              dtype=np.float32)
+        self._pool_pos = -1
+
+        self.env_idx = np.arange(self.num_envs)
+        self._is_configured = True
+
+    # should be implemented
+    def _reset_envs(self, idx):
+        raise NotImplementedError
+
+    def _step_env(self, actions):
+        raise NotImplementedError
+
+    def _render_feature_map(self):
+        raise NotImplementedError
+
+    def _get_center(self):
+        raise NotImplementedError
+
+    def _get_states(self, idx):
+        raise NotImplementedError
+
+    def _set_states(self, idx, values):
+        raise NotImplementedError
+
+    # gym-like functions
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def reset(self):
+        if not self._is_configured:
+            self.configure()
+        self.step_cnt.fill(0)
+        self._reset_envs(self.env_idx)
+        return self.get_obs()
+
+    def step(self, actions):
+        '''
+        Step every env with its action. Finished envs are reset right away,
+        so the returned observation of those is the first one of a new game.
+        '''
+        actions = np.asarray(actions, dtype=np.intp)
+        assert actions.shape == (self.num_envs,)
+        assert ((actions >= 0) & (actions < self.action_space.n)).all()
+
+        rews, dones = self._step_env(actions)
+        self.step_cnt += 1
+        if self.max_step > 0:
+            dones |= self.step_cnt > self.max_step
+        if dones.any():
+            idx = np.flatnonzero(dones)
+            self.step_cnt[idx] = 0
+            self._reset_envs(idx)
+        obs = self.get_obs()
+        info = None
+
+        return obs, rews, dones, info
+
+    # state snapshots
+    def get_state(self, idx=None):
+        '''
+        Return the states of the envs in idx (all by default) as int64 rows
+        laid out like GridEnv.get_state without rng
+        '''
+        if idx is None:
+            idx = self.env_idx
+        values = self._get_states(idx)
+        n, k = values.shape
+        head = np.stack([self.step_cnt[idx], np.full(n, k)], axis=1)
+        return np.concatenate([head, values], axis=1).astype(np.int64)
+
+    def set_state(self, states, idx=None):
+        '''
+        Restore rows of get_state (or of GridEnv.get_state) into the envs in
+        idx, all at once
+        '''
+        if idx is None:
+            idx = self.env_idx
+        idx = np.asarray(idx, dtype=np.intp)
+        states = np.asarray(states, dtype=np.int64)
+        k = int(states[0, 1])
+        self.step_cnt[idx] = states[:, 0]
+        self._set_states(idx, states[:, 2:2+k])
+
+    # utils functions
+    def get_obs(self):
+        '''
+        Return the feature maps (or the views in center mode) of all envs
+        stacked on the first axis. The array is reused by the next step, or
+        by the step obs_pool steps later with a pool.
+        '''
+        self._render_feature_map()
+        obs = self.obs_map
+        if self.obs_pool:
+            self._pool_pos = (self._pool_pos + 1) % self.obs_pool
+            obs = self._pool[self._pool_pos]
+        if self.center:
+            corners = np.stack(self.cell_to_pos(self._get_center()), axis=1)
+            gather_views(self.padded_map, corners, self.obs_size, out=obs)
+        elif self.obs_pool:
+            obs[:] = self.obs_map
+        return obs
+
+    def cell_to_pos(self, cells):
+        '''
+        Return (x, y) arrays of cell ids
+        '''
+        return np.divmod(cells, self.grid_size[1])
+
+    def _sample_cells(self, n, k, occupied=None):
+        '''
+        Sample k distinct cells for each of n envs, in random order.
+        Cells set in `occupied` (bool array of shape (n, cell_n)) are skipped.
+        '''
+        keys = self.np_random.random_sample((n, self.cell_n))
+        if occupied is not None:
+            keys[occupied] = 2.
+        if k < self.cell_n:
+            cells = np.argpartition(keys, k - 1, axis=1)[:, :k]
+        else:
+            cells = np.tile(np.arange(self.cell_n), (n, 1))
+        order = np.argsort(np.take_along_axis(keys, cells, axis=1), axis=1)
+        return np.take_along_axis(cells, order, axis=1)
+
+    def _sample_free(self, occupied, tries=4):
+        '''
+        Sample one cell not set in `occupied` for each row of it
+        '''
+        n = occupied.shape[0]
+        rows = np.arange(n)
+        cells = self.np_random.randint(self.cell_n, size=n)
+        bad = occupied[rows, cells]
+        for _ in range(tries):
+            if not bad.any():
+                return cells
+            bad_idx = np.flatnonzero(bad)
+            cells[bad_idx] = self.np_random.randint(self.cell_n,
+                                                    size=len(bad_idx))
+            bad[bad_idx] = occupied[bad_idx, cells[bad_idx]]
+        # crowded maps, fall back to exact sampling
+        if bad.any():
+            bad_idx = np.flatnonzero(bad)
+            cells[bad_idx] = self._sample_cells(len(bad_idx), 1,
+                                                occupied[bad_idx])[:, 0]
+        return cells
@@ -0,0 +1,89 @@
+import numpy as np
+
+from .base import BatchGridEnv
+from ..envs.eat_bullet import EatBulletEnv
+
+
+class EatBulletBatchEnv(BatchGridEnv):
+    '''
+    EatBulletEnv stepped for num_envs games at once
+    '''
+    reward_range = EatBulletEnv.reward_range
+
+    ActionNames = EatBulletEnv.ActionNames
+    Action = EatBulletEnv.Action
+
+    def configure(self, grid_size=(10, 10),
+                  food_n: int = 3,
+                  max_step: int = 500,
+                  **kwargs):
+        super().configure(self.ActionNames, grid_size,
+                          n_features=3,
+                          max_step=max_step, **kwargs)
+        self.food_n = food_n
+        self.player_pos = np.zeros(self.num_envs, dtype=np.intp)
+        self.foods_pos = np.zeros((self.num_envs, food_n), dtype=np.intp)
+        self.food_grid = np.zeros((self.num_envs, self.cell_n), dtype=bool)
+
+    def _reset_envs(self, idx):
+        cells = self._sample_cells(len(idx), 1 + self.food_n)
+        self.player_pos[idx] = cells[:, 0]
+        self.foods_pos[idx] = cells[:, 1:]
+        self.food_grid[idx] = False
+        self.food_grid[idx[:, None], cells[:, 1:]] = True
+
+    def _step_env(self, actions):
+        self.player_pos = self.next_cell[self.player_pos, actions]
+        eaten = self.food_grid[self.env_idx, self.player_pos]
+        rews = eaten.astype(np.float32)
+        if eaten.any():
+            self._respawn(np.flatnonzero(eaten))
+        return rews, np.zeros(self.num_envs, dtype=bool)
+
+    def _respawn(self, idx):
+        # like rand_pos(skip=foods_pos), the eaten food still blocks its cell
+        pos = self.player_pos[idx]
+        new_pos = self._sample_free(self.food_grid[idx])
+        slot = np.argmax(self.foods_pos[idx] == pos[:, None], axis=1)
+        self.food_grid[idx, pos] = False
+        self.food_grid[idx, new_pos] = True
+        self.foods_pos[idx, slot] = new_pos
+
+    def _get_states(self, idx):
+        return np.concatenate([self.player_pos[idx, None],
+                               np.sort(self.foods_pos[idx], axis=1)], axis=1)
+
+    def _set_states(self, idx, values):
+        self.player_pos[idx] = values[:, 0]
+        self.foods_pos[idx] = values[:, 1:]
+        self.food_grid[idx] = False
+        self.food_grid[idx[:, None], values[:, 1:]] = True
+
+    def _get_center(self):
+        return self.player_pos
+
+    def _render_feature_map(self):
+        self.feature_map[..., 0] = 0
+        self.flat_map[self.env_idx, self.map_cell[self.player_pos], 0] = 1
+        self.feature_map[..., 1] = self.food_grid.reshape(
+            self.feature_map.shape[:3])
+
+
+class EatBulletMemBatchEnv(EatBulletBatchEnv):
+    '''
+    EatBulletMemEnv stepped for num_envs games at once
+    '''
+    def configure(self, disappear_dist=3, **kwargs):
+        super().configure(**kwargs)
+        self.disappear_dist = disappear_dist
+
+    def _render_feature_map(self):
+        self.feature_map[..., :2] = 0
+        self.flat_map[self.env_idx, self.map_cell[self.player_pos], 0] = 1
+
+        # foods far enough from the player, by the distance of every food
+        fx, fy = self.cell_to_pos(self.foods_pos)
+        px, py = self.cell_to_pos(self.player_pos[:, None])
+        visible = np.abs(fx - px) + np.abs(fy - py) >= self.disappear_dist
+        self.flat_map[self.env_idx[:, None], self.map_cell[self.foods_pos],
+                      1] = visible
@@ -0,0 +1,125 @@
+import numpy as np
+
+from .base import BatchGridEnv
+from ..envs.pickput import PickputEnv, TaskType, State, Action, action_types
+
+
+class PickputBatchEnv(BatchGridEnv):
+    '''
+    PickputEnv stepped for num_envs games at once
+
+    task_type may be a single TaskType or one per env.
+    '''
+    reward_range = PickputEnv.reward_range
+
+    def configure(self, grid_size=(10, 10),
+                  task_type=TaskType.pick, max_step=500, **kwargs):
+        super().configure(action_types, grid_size,
+                          n_features=4,
+                          max_step=max_step, **kwargs)
+        n = self.num_envs
+        self.task_type = np.empty(n, dtype=np.int8)
+        self.task_type[:] = task_type
+        self.state = np.full(n, State.start, dtype=np.int8)
+        self.first_pick = np.zeros(n, dtype=bool)
+
+        self.player_pos = np.zeros(n, dtype=np.intp)
+        self.obj_pos = np.zeros(n, dtype=np.intp)
+        self.mark_pos = np.zeros(n, dtype=np.intp)
+        # whether obj_pos / mark_pos is set (not None in PickputEnv)
+        self.has_obj = np.zeros(n, dtype=bool)
+        self.has_mark = np.zeros(n, dtype=bool)
+
+    def _reset_envs(self, idx):
+        n = len(idx)
+        task = self.task_type[idx]
+        has_pick = (task & TaskType.pick) != 0
+        has_put = (task & TaskType.put) != 0
+
+        self.player_pos[idx] = self.np_random.randint(self.cell_n, size=n)
+        obj_pos = self.np_random.randint(self.cell_n, size=n)
+        # the mark never shares the cell of the obj
+        mark_pos = self.np_random.randint(self.cell_n - 1, size=n)
+        mark_pos += has_pick & (mark_pos >= obj_pos)
+        mark_pos[~has_pick] = self.np_random.randint(self.cell_n,
+                                                     size=n - has_pick.sum())
+
+        self.obj_pos[idx] = obj_pos
+        self.mark_pos[idx] = mark_pos
+        self.has_obj[idx] = has_pick
+        self.has_mark[idx] = has_put
+        self.first_pick[idx] = task != TaskType.put
+        self.state[idx] = np.where(has_pick, State.start, State.picked)
+
+    def _step_env(self, actions):
+        rews = np.zeros(self.num_envs, dtype=np.float32)
+
+        prev_pos = self.player_pos
+        self.player_pos = self.next_cell[prev_pos, actions]
+        # penalty
+        rews -= self.is_move[actions] & (self.player_pos == prev_pos)
+
+        # in the start state the obj always exists
+        pick = ((actions == Action.pick) & (self.state == State.start) &
+                (self.obj_pos == self.player_pos))
+        rews += pick & self.first_pick
+        self.first_pick &= ~pick
+        has_put = (self.task_type & TaskType.put) != 0
+        self.state[pick & has_put] = State.picked
+        self.state[pick & ~has_put] = State.end
+
+        # the picked state only happens with a mark
+        put = (actions == Action.put) & (self.state == State.picked)
+        put_ok = put & (self.mark_pos == self.player_pos)
+        put_fail = put & ~put_ok
+        self.state[put_ok] = State.end
+        rews += put_ok
+        self.state[put_fail] = State.start
+        self.obj_pos[put_fail] = self.player_pos[put_fail]
+        self.has_obj[put_fail] = True
+        rews -= put_fail
+
+        dones = self.state == State.end
+        rews += 5 * dones
+
+        return rews, dones
+
+    def _get_states(self, idx):
+        return np.stack([
+            self.player_pos[idx],
+            np.where(self.has_obj[idx], self.obj_pos[idx], -1),
+            np.where(self.has_mark[idx], self.mark_pos[idx], -1),
+            self.state[idx],
+            self.first_pick[idx],
+        ], axis=1)
+
+    def _set_states(self, idx, values):
+        player, obj, mark, state, first_pick = values.T
+        self.player_pos[idx] = player
+        self.has_obj[idx] = obj >= 0
+        self.obj_pos[idx] = np.maximum(obj, 0)
+        self.has_mark[idx] = mark >= 0
+        self.mark_pos[idx] = np.maximum(mark, 0)
+        self.state[idx] = state
+        self.first_pick[idx] = first_pick
+
+    def _get_center(self):
+        return self.player_pos
+
+    def _render_feature_map(self):
+        self.feature_map[..., :3] = 0
+        feat_cnt = 0
+
+        picked = self.state == State.picked
+        self.flat_map[self.env_idx, self.map_cell[self.player_pos],
+                      feat_cnt] = np.where(picked, 1., .5)
+        feat_cnt += 1
+
+        # draw obj
+        idx = np.flatnonzero(self.has_obj & (self.state == State.start))
+        self.flat_map[idx, self.map_cell[self.obj_pos[idx]], feat_cnt] = 1
+        feat_cnt += 1
+
+        # draw mark
+        idx = np.flatnonzero(self.has_mark)
+        self.flat_map[idx, self.map_cell[self.mark_pos[idx]], feat_cnt] = 1
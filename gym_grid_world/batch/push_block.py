@@ -0,0 +1,114 @@
+import numpy as np
+
+from .base import BatchGridEnv
+from ..envs.push_block import PushBlockEnv, State, action_types
+from ..envs.push_block_levels import load_levels
+
+
+class PushBlockBatchEnv(BatchGridEnv):
+    '''
+    PushBlockEnv stepped for num_envs games at once
+
+    Objects and marks are kept as per-env occupancy grids, and the number of
+    objects lying on marks is updated on every push.
+    '''
+    reward_range = PushBlockEnv.reward_range
+
+    def configure(self, grid_size=(10, 10),
+                  max_step=200, obj_n=1, level_bank=None, **kwargs):
+        super().configure(action_types, grid_size,
+                          n_features=4,
+                          max_step=max_step, **kwargs)
+        n = self.num_envs
+        self.obj_n = obj_n
+        self.player_pos = np.zeros(n, dtype=np.intp)
+        self.obj_grid = np.zeros((n, self.cell_n), dtype=bool)
+        self.mark_grid = np.zeros((n, self.cell_n), dtype=bool)
+        self.on_mark_cnt = np.zeros(n, dtype=np.intp)
+
+        w, h = grid_size
+        x, y = self.cell_to_pos(np.arange(self.cell_n))
+        self.edge_mask = (x == 0) | (y == 0) | (x == w-1) | (y == h-1)
+
+        self.levels = None
+        if level_bank is not None:
+            self.levels = load_levels(level_bank, grid_size, obj_n)
+
+    def _reset_envs(self, idx):
+        n = len(idx)
+        if self.levels is not None:
+            rows = self.levels[self.np_random.randint(len(self.levels),
+                                                      size=n)]
+            self._set_states(idx, np.concatenate(
+                [np.full((n, 1), State.start), rows], axis=1))
+            return
+
+        edges = np.broadcast_to(self.edge_mask, (n, self.cell_n))
+        obj_pos = self._sample_cells(n, self.obj_n, edges)
+        self.obj_grid[idx] = False
+        self.obj_grid[idx[:, None], obj_pos] = True
+
+        cells = self._sample_cells(n, 1 + self.obj_n, self.obj_grid[idx])
+        self.player_pos[idx] = cells[:, 0]
+        self.mark_grid[idx] = False
+        self.mark_grid[idx[:, None], cells[:, 1:]] = True
+        self.on_mark_cnt[idx] = 0
+
+    def _step_env(self, actions):
+        prev_pos = self.player_pos
+        new_pos = self.next_cell[prev_pos, actions]
+
+        # the target equals new_pos when pushing into the wall
+        push = self.obj_grid[self.env_idx, new_pos]
+        target = self.next_cell[new_pos, actions]
+        blocked = push & ((target == new_pos) |
+                          self.obj_grid[self.env_idx, target])
+
+        idx = np.flatnonzero(push & ~blocked)
+        src, dst = new_pos[idx], target[idx]
+        self.obj_grid[idx, src] = False
+        self.obj_grid[idx, dst] = True
+        self.on_mark_cnt[idx] += (self.mark_grid[idx, dst].astype(np.intp) -
+                                  self.mark_grid[idx, src])
+
+        new_pos[blocked] = prev_pos[blocked]
+        self.player_pos = new_pos
+
+        moved = self.is_move[actions]
+        dones = moved & (self.on_mark_cnt == self.obj_n)
+        # penalty
+        rews = -(moved & (new_pos == prev_pos)).astype(np.float32)
+        rews += 5 * dones
+
+        return rews, dones
+
+    def _get_states(self, idx):
+        n = len(idx)
+        # each row has obj_n cells set, found in increasing order
+        objs = np.nonzero(self.obj_grid[idx])[1].reshape((n, self.obj_n))
+        marks = np.nonzero(self.mark_grid[idx])[1].reshape((n, self.obj_n))
+        # finished games are reset inside step
+        return np.concatenate([np.full((n, 1), State.start),
+                               self.player_pos[idx, None], objs, marks],
+                              axis=1)
+
+    def _set_states(self, idx, values):
+        objs = values[:, 2:2+self.obj_n]
+        marks = values[:, 2+self.obj_n:]
+        self.player_pos[idx] = values[:, 1]
+        self.obj_grid[idx] = False
+        self.obj_grid[idx[:, None], objs] = True
+        self.mark_grid[idx] = False
+        self.mark_grid[idx[:, None], marks] = True
+        self.on_mark_cnt[idx] = (self.obj_grid[idx] &
+                                 self.mark_grid[idx]).sum(axis=1)
+
+    def _get_center(self):
+        return self.player_pos
+
+    def _render_feature_map(self):
+        shape = self.feature_map.shape[:3]
+        self.feature_map[..., 0] = 0
+        self.flat_map[self.env_idx, self.map_cell[self.player_pos], 0] = 1
+        self.feature_map[..., 1] = self.obj_grid.reshape(shape)
+        self.feature_map[..., 2] = self.mark_grid.reshape(shape)
@@ -0,0 +1,150 @@
+import ctypes
+import multiprocessing as mp
+import numpy as np
+
+import gym
+
+
+def _make_env(env_id, seed, kwargs):
+    # registers the ids in a spawned process
+    import gym_grid_world  # noqa: F401
+    env = gym.make(env_id).unwrapped
+    env.seed(seed)
+    env.configure(**kwargs)
+    return env
+
+
+def _worker(remote, parent_remote, env_id, seeds, kwargs, lo, bufs):
+    parent_remote.close()
+    envs = [_make_env(env_id, seed, kwargs) for seed in seeds]
+    obs, rews, dones, actions = SubprocVecEnv._views(*bufs)
+    hi = lo + len(envs)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                for k, env in zip(range(lo, hi), envs):
+                    _, rew, done, _ = env.step(actions[k], out=obs[k])
+                    if done:
+                        env.reset(out=obs[k])
+                    rews[k] = rew
+                    dones[k] = done
+                remote.send(None)
+            elif cmd == 'reset':
+                for k, env in zip(range(lo, hi), envs):
+                    env.reset(out=obs[k])
+                remote.send(None)
+            elif cmd == 'call':
+                name, args = data
+                remote.send([getattr(env, name)(*args) for env in envs])
+            elif cmd == 'close':
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+
+class SubprocVecEnv:
+    '''
+    Run num_envs envs of a registered id in worker processes.
+
+    Workers write observations, rewards and dones straight into shared
+    memory, only short commands go through the pipes. Finished envs are
+    reset inside step, like the batched envs. Observations are stored with
+    the dtype of observation_space and the returned arrays are reused by
+    the next step.
+    '''
+
+    def __init__(self, env_id: str, num_envs: int, n_workers=None,
+                 seed=None, context=None, **kwargs):
+        '''
+        kwargs are passed to configure of every env
+        '''
+        self.num_envs = num_envs
+        n_workers = min(n_workers or mp.cpu_count(), num_envs)
+
+        env = _make_env(env_id, None, kwargs)
+        self.observation_space = env.observation_space
+        self.action_space = env.action_space
+        env.close()
+
+        obs_shape = (num_envs, *self.observation_space.shape)
+        obs_dtype = np.dtype(self.observation_space.dtype)
+        nbytes = int(np.prod(obs_shape)) * obs_dtype.itemsize
+        self._bufs = (
+            (mp.RawArray(ctypes.c_byte, nbytes), obs_shape, obs_dtype.str),
+            mp.RawArray(ctypes.c_float, num_envs),
+            mp.RawArray(ctypes.c_bool, num_envs),
+            mp.RawArray(ctypes.c_int64, num_envs),
+        )
+        self.obs, self.rews, self.dones, self.actions = self._views(
+            *self._bufs)
+
+        if seed is None:
+            seed = np.random.randint(2 ** 31 - 1 - num_envs)
+        ctx = mp.get_context(context)
+        bounds = np.linspace(0, num_envs, n_workers + 1).astype(int)
+        self.remotes, self.processes = [], []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            remote, work_remote = ctx.Pipe()
+            seeds = list(range(seed + lo, seed + hi))
+            proc = ctx.Process(target=_worker,
+                               args=(work_remote, remote, env_id, seeds,
+                                     kwargs, lo, self._bufs),
+                               daemon=True)
+            proc.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(proc)
+        self.closed = False
+
+    @staticmethod
+    def _views(obs_buf, rews_buf, dones_buf, actions_buf):
+        raw, shape, dtype = obs_buf
+        obs = np.frombuffer(raw, dtype=dtype).reshape(shape)
+        return (obs,
+                np.frombuffer(rews_buf, dtype=np.float32),
+                np.frombuffer(dones_buf, dtype=bool),
+                np.frombuffer(actions_buf, dtype=np.int64))
+
+    def _broadcast(self, cmd, data=None):
+        for remote in self.remotes:
+            remote.send((cmd, data))
+        return [remote.recv() for remote in self.remotes]
+
+    def reset(self):
+        self._broadcast('reset')
+        return self.obs
+
+    def step_async(self, actions):
+        self.actions[:] = actions
+        for remote in self.remotes:
+            remote.send(('step', None))
+
+    def step_wait(self):
+        for remote in self.remotes:
+            remote.recv()
+        return self.obs, self.rews.copy(), self.dones.copy(), None
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def call(self, name, *args):
+        '''
+        Call a method of every env, return the results in env order
+        '''
+        results = self._broadcast('call', (name, args))
+        return [x for worker_results in results for x in worker_results]
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for proc in self.processes:
+            proc.join()
+        for remote in self.remotes:
+            remote.close()
+        self.closed = True
@@ -1,10 +1,23 @@
+import time
+from functools import wraps
+
 import numpy as np
 
 import gym
 from gym import spaces
 from gym.utils import seeding
 
-from PIL import Image, ImageDraw
+
+def _timed(fn, stat):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        st = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stat[0] += 1
+            stat[1] += time.perf_counter() - st
+    return wrapper
 
 
 class BaseEnv(gym.Env):
@@ -12,21 +25,41 @@ class BaseEnv(gym.Env):
     Abstract class for visual environments rendered by PIL
     '''
     metadata = {'render.modes': ['human', 'rgb_array']}
+    # methods timed by enable_profiling
+    ProfilePhases = ('step', 'get_obs', '_step_env', '_render_env',
+                     '_get_raw_array', 'get_bitmap')
 
     def __init__(self):
         self.seed()
         self.__configured = False
 
-    def configure(self, actions, frame_size, *, raw_array=False, max_step=-1):
+    def configure(self, actions, frame_size, *, raw_array=False, max_step=-1,
+                  obs_dtype=None, obs_pool=0):
         '''
         Usage:
             self.super()._configure(actions, frame_size)
+
+        obs_dtype: dtype of the observations. RGB frames are float32 by
+            default and returned without conversion with uint8. Raw arrays
+            also accept 'bits', see GridEnv.
+        obs_pool: write the observations into a ring of this many buffers,
+            so the last obs_pool observations stay valid without copies
         '''
+        if obs_dtype == 'bits' and not raw_array:
+            raise ValueError('bits observations need raw_array')
         self.frame_size = frame_size
         self.raw_array = raw_array
+        self.obs_dtype = obs_dtype
+        self.bitmap_dtype = np.dtype(
+            'float32' if obs_dtype in (None, 'bits') else obs_dtype)
 
-        self.image = Image.new('RGB', self.frame_size, 'black')
-        self.draw = ImageDraw.Draw(self.image)
+        # PIL is imported and the images are allocated on the first draw
+        self.image = None
+        self.draw = None
+
+        self.obs_pool = obs_pool
+        self._pool = None
+        self._pool_pos = -1
 
         self.max_step = max_step
         self.step_cnt = 0
@@ -63,12 +96,16 @@ class BaseEnv(gym.Env):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
 
-    def reset(self):
+    def reset(self, out=None):
         self.step_cnt = 0
         self.init()
-        return self.get_obs()
+        return self.get_obs(out)
 
-    def step(self, action):
+    def step(self, action, out=None):
+        '''
+        out: optional array the observation is written into, e.g. a slot of
+            a replay buffer
+        '''
         action = int(action)
         assert 0 <= action < self.action_space.n
 
@@ -76,7 +113,7 @@ class BaseEnv(gym.Env):
         self.step_cnt += 1
         if self.max_step > 0 and self.step_cnt > self.max_step:
             done = True
-        obs = self.get_obs()
+        obs = self.get_obs(out)
         info = None
 
         return obs, rew, done, info
@@ -86,13 +123,82 @@ class BaseEnv(gym.Env):
             return self.get_bitmap()
 
     # utils functions
-    def get_obs(self):
+    def get_obs(self, out=None):
+        if out is None and self.obs_pool:
+            return self._get_pooled_obs()
+        return self._get_obs(out)
+
+    def _get_pooled_obs(self):
+        if self._pool is None:
+            # the buffers take the shape and dtype of the first observation
+            obs = self._get_obs()
+            self._pool = np.empty((self.obs_pool, *obs.shape),
+                                  dtype=obs.dtype)
+            self._pool_pos = 0
+            self._pool[0] = obs
+            return self._pool[0]
+        self._pool_pos = (self._pool_pos + 1) % self.obs_pool
+        return self._get_obs(self._pool[self._pool_pos])
+
+    def _get_obs(self, out=None):
         if self.raw_array:
-            return self._get_raw_array()
+            obs = self._get_raw_array()
+            if out is None:
+                return obs
+            np.copyto(out, obs, casting='unsafe')
+            return out
         else:
             self._render_env()
-            return self.get_bitmap()
+            return self.get_bitmap(out)
+
+    def _alloc_image(self):
+        from PIL import Image, ImageDraw
+        self.image = Image.new('RGB', self.frame_size, 'black')
+        self.draw = ImageDraw.Draw(self.image)
 
-    def get_bitmap(self):
-        arr = np.array(self.image).reshape((*self.frame_size, 3))
-        return arr.astype('float32')
+    def get_bitmap(self, out=None):
+        if self.image is None:
+            self._alloc_image()
+        arr = np.asarray(self.image).reshape((*self.frame_size, 3))
+        if out is None:
+            return arr.astype(self.bitmap_dtype)
+        np.copyto(out, arr, casting='unsafe')
+        return out
+
+    # profiling
+    def enable_profiling(self):
+        '''
+        Time every phase of ProfilePhases. The methods are wrapped on the
+        instance only, so an env without profiling runs the plain methods.
+        '''
+        if getattr(self, '_profile_stats', None) is None:
+            self._profile_stats = {}
+        for name in self.ProfilePhases:
+            if name in self.__dict__:
+                continue
+            stat = self._profile_stats.setdefault(name, [0, 0.])
+            setattr(self, name, _timed(getattr(self, name), stat))
+
+    def disable_profiling(self):
+        for name in self.ProfilePhases:
+            self.__dict__.pop(name, None)
+
+    def get_profile_stats(self):
+        '''
+        Return {phase: {'calls', 'total', 'mean'}} with times in seconds.
+        The times of nested phases are included in their callers, e.g. step
+        contains get_obs.
+        '''
+        stats = getattr(self, '_profile_stats', None) or {}
+        return {
+            name: {
+                'calls': calls,
+                'total': total,
+                'mean': total / calls if calls else 0.,
+            }
+            for name, (calls, total) in stats.items()
+        }
+
+    def reset_profile_stats(self):
+        for stat in (getattr(self, '_profile_stats', None) or {}).values():
+            stat[:] = [0, 0.]
@@ -17,6 +17,10 @@ class EatBulletEnv(GridEnv):
         Action.right: Point(1, 0),
         Action.left: Point(-1, 0),
     }
+    Sprites = [
+        (0, None, 'ellipse', 'blue'),
+        (1, None, 'rect', 'green'),
+    ]
 
     def __init__(self) -> None:
         super().__init__()
@@ -28,7 +32,8 @@ class EatBulletEnv(GridEnv):
                   **kwargs):
         super().configure(self.ActionNames, grid_size, block_size,
                           n_features=3,
-                          max_step=max_step, **kwargs)
+                          max_step=max_step,
+                          max_entities=1 + food_n, **kwargs)
         self.player_pos = None # type: Point
         self.food_n = food_n
         self.foods_pos = [] # type: List[Point]
@@ -42,6 +47,8 @@ class EatBulletEnv(GridEnv):
         pos_list = self.rand_pos(size=pos_cnt)
         self.player_pos = pos_list.pop()
         self.foods_pos = set(pos_list)
+        for pos in self.foods_pos:
+            self.take_pos(pos)
 
     def _step_env(self, act) -> Tuple[float, bool]:
         if act is None:
@@ -52,10 +59,8 @@ class EatBulletEnv(GridEnv):
 
         if act in self.Movesets:
             prev_pos = self.player_pos
-            self.player_pos += self.Movesets[act]
-
-            if not self.is_in_map(self.player_pos):
-                self.player_pos = prev_pos
+            self.player_pos = self.move(prev_pos, act)
+            self.touch(prev_pos, self.player_pos)
 
         rew += self._check_eaten()
 
@@ -63,18 +68,37 @@ class EatBulletEnv(GridEnv):
 
     def _check_eaten(self) -> float:
         if self.player_pos in self.foods_pos:
-            new_food_pos = self.rand_pos(skip=self.foods_pos)
-            self.foods_pos.remove(self.player_pos)
-            self.foods_pos.add(new_food_pos)
+            self._respawn_food(self.player_pos)
             return 1.
         else:
             return 0.
 
+    def _respawn_food(self, pos):
+        # the eaten food is released after sampling, like
+        # rand_pos(skip=self.foods_pos)
+        new_food_pos = self.rand_free_pos()
+        self.foods_pos.remove(pos)
+        self.foods_pos.add(new_food_pos)
+        self.release_pos(pos)
+        self.take_pos(new_food_pos)
+        self.touch(new_food_pos)
+        return new_food_pos
+
+    def _get_state(self):
+        return ([self.cell_id(self.player_pos)] +
+                sorted(self.cell_id(pos) for pos in self.foods_pos))
+
+    def _set_state(self, values):
+        self.player_pos = self.cell_points[values[0]]
+        self.foods_pos = set(self.cell_points[cell] for cell in values[1:])
+        for pos in self.foods_pos:
+            self.take_pos(pos)
+
     def _get_center(self):
         return self.player_pos
 
     def _render_feature_map(self):
-        self.feature_map.fill(0)
+        self.feature_map[:, :, :-1] = 0
         feat_cnt = 0
 
         loc = tuple(self.player_pos)
@@ -87,8 +111,16 @@ class EatBulletEnv(GridEnv):
             self.feature_map[loc][feat_cnt] = 1
         feat_cnt += 1
 
-        self.feature_map[:,:,feat_cnt] = 1
+    def _get_entities(self):
+        return ([(self.player_pos, 0, 1)] +
+                [(pos, 1, 1) for pos in self.foods_pos])
 
+    def _render_cell(self, pos):
+        loc = tuple(pos)
+        if pos == self.player_pos:
+            self.feature_map[loc][0] = 1
+        if pos in self.foods_pos:
+            self.feature_map[loc][1] = 1
 
     def _render_grid(self):
         # clear canvas
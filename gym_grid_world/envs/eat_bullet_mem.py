@@ -15,9 +15,56 @@ class EatBulletMemEnv(EatBulletEnv):
                   **kwargs):
         super().configure(**kwargs)
         self.disappear_dist = disappear_dist
+        self.food_grid = np.zeros(self.grid_size, dtype=bool)
+        # far_kernel[w-1 + dx, h-1 + dy] tells whether a food at (dx, dy)
+        # from the player is visible, see _get_visible
+        w, h = self.grid_size
+        dx = np.abs(np.arange(-(w-1), w))
+        dy = np.abs(np.arange(-(h-1), h))
+        self.far_kernel = dx[:, None] + dy[None, :] >= disappear_dist
+
+    def _init(self):
+        super()._init()
+        self._update_food_grid()
+
+    def _set_state(self, values):
+        super()._set_state(values)
+        self._update_food_grid()
+
+    def _update_food_grid(self):
+        self.food_grid.fill(False)
+        for pos in self.foods_pos:
+            self.food_grid[pos.x, pos.y] = True
+
+    def _respawn_food(self, pos):
+        new_food_pos = super()._respawn_food(pos)
+        self.food_grid[pos.x, pos.y] = False
+        self.food_grid[new_food_pos.x, new_food_pos.y] = True
+        return new_food_pos
+
+    def _step_env(self, act):
+        prev_pos = self.player_pos
+        ret = super()._step_env(act)
+        # the visibility of every food depends on the player, redraw the
+        # whole food channel at once
+        if self.player_pos != prev_pos:
+            self._full_redraw = True
+        return ret
+
+    def _get_far(self):
+        '''
+        Return the (W, H) mask of the cells at a distance of at least
+        disappear_dist from the player, a view of far_kernel
+        '''
+        w, h = self.grid_size
+        x, y = self.player_pos
+        return self.far_kernel[w-1-x:2*w-1-x, h-1-y:2*h-1-y]
+
+    def _get_visible(self):
+        return self.food_grid & self._get_far()
 
     def _render_feature_map(self):
-        self.feature_map.fill(0)
+        self.feature_map[:, :, :-1] = 0
         feat_cnt = 0
 
         loc = tuple(self.player_pos)
@@ -25,14 +72,22 @@ class EatBulletMemEnv(EatBulletEnv):
         feat_cnt += 1
 
         # draw foods
-        for pos in self.foods_pos:
-            dis = (self.player_pos - pos).abs()
-            if dis >= self.disappear_dist:
-                loc = tuple(pos)
-                self.feature_map[loc][feat_cnt] = 1
+        self.feature_map[:, :, feat_cnt] = self._get_visible()
         feat_cnt += 1
 
-        self.feature_map[:,:,feat_cnt] = 1
+    def _get_entities(self):
+        xs, ys = np.nonzero(self._get_visible())
+        h = self.grid_size[1]
+        return ([(self.player_pos, 0, 1)] +
+                [(self.cell_points[cell], 1, 1)
+                 for cell in (xs * h + ys).tolist()])
+
+    def _render_cell(self, pos):
+        loc = tuple(pos)
+        if pos == self.player_pos:
+            self.feature_map[loc][0] = 1
+        if self.food_grid[loc] and self._get_far()[loc]:
+            self.feature_map[loc][1] = 1
 
     def _render_grid(self):
         # clear canvas
@@ -43,8 +98,8 @@ class EatBulletMemEnv(EatBulletEnv):
         self.draw.ellipse(loc, fill='blue')
 
         # draw foods
-        for pos in self.foods_pos:
-            dis = (self.player_pos - pos).abs()
-            if dis >= self.disappear_dist:
-                loc = self.get_frame_rect(pos)
-                self.draw.rectangle(loc, fill='green')
+        s = self.block_size
+        xs, ys = np.nonzero(self._get_visible())
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            self.draw.rectangle((x * s, y * s, (x+1) * s - 1, (y+1) * s - 1),
+                                fill='green')
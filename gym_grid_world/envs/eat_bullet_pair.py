@@ -17,6 +17,11 @@ class EatBulletPairEnv(GridEnv):
         Action.right: Point(1, 0),
         Action.left: Point(-1, 0),
     }
+    Sprites = [
+        (0, None, 'ellipse', 'blue'),
+        (2, None, 'rect', 'green'),
+        (1, None, 'rect', 'red'),
+    ]
 
     def __init__(self) -> None:
         super().__init__()
@@ -28,7 +33,8 @@ class EatBulletPairEnv(GridEnv):
                   **kwargs):
         super().configure(self.ActionNames, grid_size, block_size,
                           n_features=4,
-                          max_step=max_step, **kwargs)
+                          max_step=max_step,
+                          max_entities=1 + 2*food_n, **kwargs)
         self.player_pos = None # type: Point
         self.food_n = food_n
         self.foods = {}
@@ -45,6 +51,8 @@ class EatBulletPairEnv(GridEnv):
             pos: 0 if idx < self.food_n else 1
             for (idx, pos) in enumerate(pos_list)
         }
+        for pos in self.foods:
+            self.take_pos(pos)
         self.last_eaten_type = None
 
     def _step_env(self, act) -> Tuple[float, bool]:
@@ -56,10 +64,8 @@ class EatBulletPairEnv(GridEnv):
 
         if act in self.Movesets:
             prev_pos = self.player_pos
-            self.player_pos += self.Movesets[act]
-
-            if not self.is_in_map(self.player_pos):
-                self.player_pos = prev_pos
+            self.player_pos = self.move(prev_pos, act)
+            self.touch(prev_pos, self.player_pos)
 
         rew += self._check_eaten()
 
@@ -69,9 +75,12 @@ class EatBulletPairEnv(GridEnv):
         if self.player_pos in self.foods:
             pos = self.player_pos
             typ = self.foods[pos]
-            new_food_pos = self.rand_pos(skip=self.foods.keys())
+            new_food_pos = self.rand_free_pos()
             self.foods.pop(pos)
             self.foods[new_food_pos] = typ
+            self.release_pos(pos)
+            self.take_pos(new_food_pos)
+            self.touch(new_food_pos)
             if self.last_eaten_type is None:
                 self.last_eaten_type = typ
                 return 0.
@@ -82,11 +91,29 @@ class EatBulletPairEnv(GridEnv):
         else:
             return 0.
 
+    def _get_state(self):
+        # [player, last_eaten_type or -1, food cells, food types]
+        foods = sorted((self.cell_id(pos), typ)
+                       for pos, typ in self.foods.items())
+        last = -1 if self.last_eaten_type is None else self.last_eaten_type
+        return ([self.cell_id(self.player_pos), last] +
+                [cell for cell, _ in foods] + [typ for _, typ in foods])
+
+    def _set_state(self, values):
+        self.player_pos = self.cell_points[values[0]]
+        self.last_eaten_type = None if values[1] < 0 else values[1]
+        n = (len(values) - 2) // 2
+        cells, types = values[2:2+n], values[2+n:]
+        self.foods = {self.cell_points[cell]: typ
+                      for cell, typ in zip(cells, types)}
+        for pos in self.foods:
+            self.take_pos(pos)
+
     def _get_center(self):
         return self.player_pos
 
     def _render_feature_map(self):
-        self.feature_map.fill(0)
+        self.feature_map[:, :, :-1] = 0
         feat_cnt = 0
 
         loc = tuple(self.player_pos)
@@ -100,7 +127,18 @@ class EatBulletPairEnv(GridEnv):
             self.feature_map[loc][feat_idx] = 1
         feat_cnt += 2
 
-        self.feature_map[:,:,feat_cnt] = 1
+    def _get_entities(self):
+        return ([(self.player_pos, 0, 1)] +
+                [(pos, 1 + int(typ == 0), 1)
+                 for pos, typ in self.foods.items()])
+
+    def _render_cell(self, pos):
+        loc = tuple(pos)
+        if pos == self.player_pos:
+            self.feature_map[loc][0] = 1
+        typ = self.foods.get(pos)
+        if typ is not None:
+            self.feature_map[loc][1 + int(typ == 0)] = 1
 
     def _render_grid(self):
         # clear canvas
@@ -1,29 +1,42 @@
-from functools import total_ordering
-import collections
+from array import array
+from collections import OrderedDict
+from functools import total_ordering, lru_cache
 import numpy as np
 from typing import Tuple
-from PIL import Image, ImageDraw
 from gym import spaces
 
 from .base import BaseEnv
 
+_scalar_types = (int, float, np.integer, np.floating)
+
 
 @total_ordering
 class Point:
+    '''
+    Position on the grid, compared and hashed like the tuple (x, y).
+    Points are values, do not modify them in place.
+    '''
+    __slots__ = ('x', 'y', '_hash')
+
     def __init__(self, x=0, y=0) -> None:
-        if isinstance(x, collections.Iterable):
-            self.x, self.y = x
-        else:
+        if isinstance(x, _scalar_types):
             self.x = x
             self.y = y
+        else:
+            self.x, self.y = x
+        self._hash = None
 
     def __add__(self, he: 'Point'):
-        he = tuple(he)
-        return Point(self.x + he[0], self.y + he[1])
+        if type(he) is Point:
+            return Point(self.x + he.x, self.y + he.y)
+        x, y = he
+        return Point(self.x + x, self.y + y)
 
     def __sub__(self, he: 'Point'):
-        he = tuple(he)
-        return Point(self.x - he[0], self.y - he[1])
+        if type(he) is Point:
+            return Point(self.x - he.x, self.y - he.y)
+        x, y = he
+        return Point(self.x - x, self.y - y)
 
     def __mul__(self, v):
         return Point(v * self.x, v * self.y)
@@ -35,31 +48,189 @@ class Point:
         return (self.x, self.y)
 
     def __iter__(self):
-        yield self.x
-        yield self.y
+        return iter((self.x, self.y))
 
     def __repr__(self):
         return '(%s, %s)' % (self.x, self.y)
 
     def __lt__(self, he: 'Point'):
-        return self.to_tuple() < tuple(he)
+        if type(he) is not Point:
+            return self.to_tuple() < tuple(he)
+        return self.x < he.x or (self.x == he.x and self.y < he.y)
 
     def __eq__(self, he: 'Point'):
-        return self.to_tuple() == tuple(he)
+        if type(he) is Point:
+            return self.x == he.x and self.y == he.y
+        try:
+            x, y = he
+        except (TypeError, ValueError):
+            return NotImplemented
+        return self.x == x and self.y == y
 
     def __hash__(self):
-        return hash(self.to_tuple())
+        h = self._hash
+        if h is None:
+            h = self._hash = hash((self.x, self.y))
+        return h
 
     def abs(self):
         return abs(self.x) + abs(self.y)
 
 
+# (dx, dy) of the move actions by name, the other actions stay in place
+MoveNames = {
+    'up': (0, -1),
+    'down': (0, 1),
+    'right': (1, 0),
+    'left': (-1, 0),
+}
+
+
+@lru_cache(maxsize=None)
+def get_next_cell(grid_size: Tuple[int, int], actions: Tuple[str, ...]):
+    '''
+    Return the read-only table next_cell[cell, action] of cell ids
+    (x * height + y). Moves into the wall stay in the current cell.
+    '''
+    w, h = grid_size
+    cells = np.arange(w * h)
+    x, y = np.divmod(cells, h)
+    table = np.empty((w * h, len(actions)), dtype=np.intp)
+    for act, name in enumerate(actions):
+        dx, dy = MoveNames.get(name, (0, 0))
+        nx, ny = x + dx, y + dy
+        valid = (nx >= 0) & (nx < w) & (ny >= 0) & (ny < h)
+        table[:, act] = np.where(valid, nx * h + ny, cells)
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=None)
+def _get_cell_lists(grid_size: Tuple[int, int], actions: Tuple[str, ...]):
+    # Points of the cell ids and get_next_cell as tuples, for the scalar
+    # envs which index them with Python ints
+    h = grid_size[1]
+    cell_points = tuple(Point(cell // h, cell % h)
+                        for cell in range(grid_size[0] * h))
+    next_cell = tuple(map(tuple, get_next_cell(grid_size, actions).tolist()))
+    return cell_points, next_cell
+
+
+def gather_views(padded_maps, corners, view_size, out=None):
+    '''
+    Return the views of view_size with top-left corners (N, 2) in the
+    padded maps (N, W, H, n_features), gathered at once. In a map padded
+    with the view radius, the corner of the view centered at a position is
+    the position itself.
+    '''
+    n, pw, ph, c = padded_maps.shape
+    vw, vh = view_size
+    xs = corners[:, 0, None] + np.arange(vw)
+    ys = corners[:, 1, None] + np.arange(vh)
+    idx = (np.arange(n)[:, None, None] * pw + xs[:, :, None]) * ph
+    idx = idx + ys[:, None, :]
+    return np.take(padded_maps.reshape((-1, c)), idx, axis=0, out=out)
+
+
+def unpack_bits(packed, n_features):
+    '''
+    Return the uint8 feature maps (..., n_features) of observations made
+    with obs_dtype='bits'
+    '''
+    return np.unpackbits(packed, axis=-1, count=n_features)
+
+
+def densify(entities, grid_size, n_features, out=None):
+    '''
+    Return the float32 feature maps (..., W, H, n_features) of entity
+    observations (..., max_entities, 5), for any number of leading axes
+    '''
+    lead = entities.shape[:-2]
+    ents = entities.reshape((-1, *entities.shape[-2:]))
+    w, h = grid_size
+    if out is None:
+        out = np.empty((*lead, w, h, n_features), dtype=np.float32)
+    flat = out.reshape((len(ents), w * h * n_features))
+    flat.fill(0)
+    out[..., -1] = 1
+
+    env, row = np.nonzero(ents[:, :, 4])
+    x, y, ch, value = ents[env, row, :4].T
+    cell = (x.astype(np.intp) * h + y.astype(np.intp)) * n_features
+    flat[env, cell + ch.astype(np.intp)] = value
+    return out
+
+
+class FreeCells:
+    '''
+    Cell ids not taken by any entity, kept in the prefix of a permutation
+    with the slot of every cell, so take, release and sample are O(1).
+    Both are C long arrays rather than lists of int objects.
+    '''
+    def __init__(self, cell_n: int) -> None:
+        self.cells = array('l', range(cell_n))
+        self.slot = array('l', range(cell_n))
+        self.size = cell_n
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, cell):
+        return self.slot[cell] < self.size
+
+    def clear(self):
+        '''
+        Release all cells
+        '''
+        self.size = len(self.cells)
+
+    def _swap(self, i, j):
+        cells, slot = self.cells, self.slot
+        cells[i], cells[j] = cells[j], cells[i]
+        slot[cells[i]] = i
+        slot[cells[j]] = j
+
+    def take(self, cell):
+        i = self.slot[cell]
+        if i < self.size:
+            self.size -= 1
+            self._swap(i, self.size)
+
+    def release(self, cell):
+        i = self.slot[cell]
+        if i >= self.size:
+            self._swap(i, self.size)
+            self.size += 1
+
+    def sample(self, rng, k=1):
+        '''
+        Return k distinct free cells, they stay free
+        '''
+        assert k <= self.size
+        for i in range(k):
+            self._swap(i, i + rng.randint(self.size - i))
+        return self.cells[:k]
+
+
 class GridEnv(BaseEnv):
     '''
     Abstract class for grid environments
     '''
     metadata = {'render.modes': ['human']}
 
+    # (channel, value, shape, color) of the entities in the feature map, in
+    # the order _render_grid draws them. value None matches any nonzero value
+    # and shape is one of 'ellipse', 'rect' and 'outline'.
+    Sprites = []
+
+    # shared by all instances, see get_tile and get_atlas
+    _tile_cache = {}
+    _atlas_cache = {}
+
+    ProfilePhases = BaseEnv.ProfilePhases + (
+        '_update_feature_map', '_render_feature_map', '_render_grid',
+        '_rasterize')
+
     def __init__(self):
         super().__init__()
 
@@ -69,33 +240,208 @@ class GridEnv(BaseEnv):
                   block_size: int,
                   n_features: int,
                   center=False, view_radius=(0, 0),
+                  renderer='pil',
+                  incremental=False,
+                  obs_cache=0,
+                  entities=False,
+                  max_entities=0,
                   **kwargs):
+        '''
+        renderer: 'pil' draws every frame with ImageDraw, 'numpy' builds the
+            frame from the feature map with pre-rasterized tiles
+        incremental: repaint only the cells touched by _step_env in the
+            feature map instead of the whole map
+        obs_cache: keep up to this many read-only observations keyed by the
+            logical state, least recently used first out
+
+        entities: with raw_array, observe max_entities rows of
+            (x, y, channel, value, valid) as float32 instead of the feature
+            map, one row per entity of _get_entities, see densify
+
+        With raw_array, obs_dtype is the dtype the feature map is rendered
+        in (float64 by default). 'bits' packs the binary channels of a cell
+        into bytes along the last axis, see unpack_bits.
+        '''
         self.grid_size = grid_size
         self.obs_size = grid_size
         self.block_size = block_size
         self.center = center
         self.n_features = n_features
-        self.feature_map = np.zeros((*grid_size, n_features))
+        # in center mode the map has a permanent zero border of view_radius
+        # cells, so every view is a single slice of padded_map
+        rx, ry = view_radius if center else (0, 0)
+        w, h = grid_size
+        raw_dtype = kwargs.get('obs_dtype') if kwargs.get('raw_array') \
+            else None
+        if raw_dtype in ('uint8', 'bits', np.uint8) and any(
+                v is not None and v != int(v) for _, v, _, _ in self.Sprites):
+            raise ValueError('%s has fractional features, not valid for %s'
+                             % (type(self).__name__, raw_dtype))
+        if raw_dtype is None:
+            map_dtype = np.float64
+        elif raw_dtype == 'bits':
+            map_dtype = np.uint8
+        else:
+            map_dtype = np.dtype(raw_dtype)
+        self.padded_map = np.zeros((w + 2*rx, h + 2*ry, n_features),
+                                   dtype=map_dtype)
+        self.feature_map = self.padded_map[rx:rx+w, ry:ry+h]
+        # the last channel marks the inside of the map and never changes
+        self.feature_map[:, :, -1] = 1
+        if entities and (center or not kwargs.get('raw_array')):
+            raise ValueError('entities observations need raw_array and '
+                             'cover the whole map')
+        self.entities = entities
+        self.entity_obs = np.zeros((max_entities, 5), dtype=np.float32)
+        # the feature map is not drawn for entity observations
+        self.incremental = incremental and not entities
+        self._dirty_cells = []
+        self._full_redraw = True
+        # built by the first take_pos or rand_free_pos, see _get_free_cells
+        self.free_cells = None
+
+        # cell ids and the move table shared by all envs of this grid size
+        self.next_cell = get_next_cell(tuple(grid_size), tuple(actions))
+        self.cell_points, self._next_cell = _get_cell_lists(
+            tuple(grid_size), tuple(actions))
         if center:
             self.obs_size = tuple(2*x+1 for x in view_radius)
-            self.obs_map = np.zeros((*self.obs_size, n_features))
+            self.obs_map = self.padded_map[:self.obs_size[0],
+                                           :self.obs_size[1]]
             self.view_radius = Point(view_radius)
             self.frame_size = tuple(x*block_size for x in self.obs_size)
             super().configure(actions, self.frame_size, **kwargs)
-
             self.whole_size = tuple(x*block_size for x in grid_size)
-            self.whole_image = Image.new('RGB', self.whole_size, 'black')
-            self.view_draw = self.draw
-            self.draw = ImageDraw.Draw(self.whole_image)
         else:
             self.obs_map = self.feature_map
             self.frame_size = tuple(x*block_size for x in grid_size)
             super().configure(actions, self.frame_size, **kwargs)
             self.whole_size = self.frame_size
 
-        if self.raw_array:
-            self.observation_space = spaces.Box(0., 1., self.obs_map.shape,
-                                                np.float32)
+        if self.entities:
+            self.observation_space = spaces.Box(
+                0., max(grid_size), self.entity_obs.shape, np.float32)
+        elif self.raw_array and self.obs_dtype == 'bits':
+            shape = (*self.obs_size, (n_features + 7) // 8)
+            self.observation_space = spaces.Box(0, 255, shape, np.uint8)
+        elif self.raw_array:
+            self.observation_space = spaces.Box(
+                0., 1., self.obs_map.shape,
+                np.dtype(self.obs_dtype or 'float32'))
+
+        # whether the frames lag behind the state, see get_info
+        self._frame_stale = True
+        self.obs_cache = obs_cache
+        self.clear_obs_cache()
+        self.renderer = renderer
+        if renderer == 'numpy':
+            self._configure_rasterizer()
+        elif renderer != 'pil':
+            raise ValueError('unknown renderer: %s' % renderer)
+
+    def init(self):
+        if self.free_cells is not None:
+            self.free_cells.clear()
+        super().init()
+        self._dirty_cells.clear()
+        self._full_redraw = True
+
+    # state snapshots
+    def get_state(self, rng=False):
+        '''
+        Return the logical state as an int64 array
+        [step_cnt, k, k values of _get_state]. Positions are cell ids and
+        sets are sorted, so equal states give equal arrays.
+
+        rng: also append the random state and the order of the free cells
+            (-1 when the env never used them), so that set_state replays
+            the same future
+        '''
+        values = self._get_state()
+        state = np.array([self.step_cnt, len(values)] + values,
+                         dtype=np.int64)
+        if not rng:
+            return state
+        _, key, pos, has_gauss, gauss = self.np_random.get_state()
+        fc = self.free_cells
+        free = [-1] if fc is None else np.concatenate([[fc.size], fc.cells])
+        return np.concatenate([
+            state, free, [pos, has_gauss],
+            np.array([gauss]).view(np.int64), key]).astype(np.int64)
+
+    def set_state(self, state):
+        '''
+        Restore an array of get_state in O(entities). The feature map and
+        the frames are redrawn by the next observation or get_info.
+        '''
+        state = np.asarray(state, dtype=np.int64)
+        self.step_cnt = int(state[0])
+        k = int(state[1])
+        if self.free_cells is not None:
+            self.free_cells.clear()
+        self._set_state(state[2:2+k].tolist())
+
+        rest = state[2+k:]
+        if len(rest):
+            if rest[0] < 0:
+                self.free_cells = None
+                n = 0
+            else:
+                fc = self._get_free_cells()
+                n = len(fc.cells)
+                fc.size = int(rest[0])
+                fc.cells = array('l', rest[1:n+1].tolist())
+                fc.slot = array('l', np.argsort(rest[1:n+1]).tolist())
+            pos, has_gauss = rest[n+1:n+3].tolist()
+            gauss = float(rest[n+3:n+4].view(np.float64)[0])
+            key = rest[n+4:].astype(np.uint32)
+            self.np_random.set_state(('MT19937', key, pos, has_gauss, gauss))
+
+        self._dirty_cells.clear()
+        self._full_redraw = True
+        self._frame_stale = True
+
+    def get_obs(self, out=None):
+        if not self.obs_cache:
+            return super().get_obs(out)
+        # the view center is the player, so it is part of the state
+        key = tuple(self._get_state())
+        cache = self._obs_cache
+        obs = cache.get(key)
+        if obs is None:
+            self._obs_cache_misses += 1
+            obs = np.array(super().get_obs())
+            obs.flags.writeable = False
+            cache[key] = obs
+            self._obs_cache_bytes += obs.nbytes
+            if len(cache) > self.obs_cache:
+                _, old = cache.popitem(last=False)
+                self._obs_cache_bytes -= old.nbytes
+        else:
+            self._obs_cache_hits += 1
+            cache.move_to_end(key)
+            # the render buffers were skipped
+            self._frame_stale = True
+        if out is None:
+            return obs
+        np.copyto(out, obs, casting='unsafe')
+        return out
+
+    def get_obs_cache_stats(self):
+        calls = self._obs_cache_hits + self._obs_cache_misses
+        return {
+            'hits': self._obs_cache_hits,
+            'misses': self._obs_cache_misses,
+            'hit_rate': self._obs_cache_hits / calls if calls else 0.,
+            'size': len(self._obs_cache),
+            'bytes': self._obs_cache_bytes,
+        }
+
+    def clear_obs_cache(self):
+        self._obs_cache = OrderedDict()
+        self._obs_cache_hits = 0
+        self._obs_cache_misses = 0
+        self._obs_cache_bytes = 0
 
     # utils functions
     def rand_pos(self, size=None, skip=set(), replace=False):
@@ -121,6 +467,42 @@ class GridEnv(BaseEnv):
                         for pos in pos_list]
             return pos_list
 
+    def cell_id(self, pos):
+        return pos.x * self.grid_size[1] + pos.y
+
+    def move(self, pos, act):
+        '''
+        Return the position after act, staying in place at the walls
+        '''
+        cell = self._next_cell[pos.x * self.grid_size[1] + pos.y][act]
+        return self.cell_points[cell]
+
+    def _get_free_cells(self):
+        if self.free_cells is None:
+            w, h = self.grid_size
+            self.free_cells = FreeCells(w * h)
+        return self.free_cells
+
+    def take_pos(self, pos):
+        self._get_free_cells().take(self.cell_id(pos))
+
+    def release_pos(self, pos):
+        # without the index every cell is free
+        if self.free_cells is not None:
+            self.free_cells.release(self.cell_id(pos))
+
+    def rand_free_pos(self, size=None):
+        '''
+        Like rand_pos, but skip the positions taken by take_pos, in O(1)
+        time per position
+        '''
+        cells = self._get_free_cells().sample(self.np_random,
+                                              1 if size is None else size)
+        pos_list = [self.cell_points[cell] for cell in cells]
+        if size is None:
+            return pos_list[0]
+        return pos_list
+
     def is_in_map(self, pos):
         return (pos.x >= 0 and pos.x < self.grid_size[0] and
                 pos.y >= 0 and pos.y < self.grid_size[1])
@@ -132,30 +514,62 @@ class GridEnv(BaseEnv):
         s = self.block_size
         return (pt.x * s, pt.y * s, (pt.x+1) * s - 1, (pt.y+1) * s - 1)
 
+    def touch(self, *cells):
+        '''
+        Mark cells whose entities changed, for the incremental mode
+        '''
+        if self.incremental:
+            self._dirty_cells.extend(cells)
+
+    def _update_feature_map(self):
+        if self.incremental and not self._full_redraw:
+            for pos in self._dirty_cells:
+                loc = tuple(pos)
+                self.feature_map[loc][:-1] = 0
+                self._render_cell(pos)
+        else:
+            self._render_feature_map()
+            self._full_redraw = False
+        self._dirty_cells.clear()
+
     def _get_raw_array(self):
-        self._render_feature_map()
+        self._frame_stale = True
+        if self.entities:
+            return self._get_entity_array()
+        self._update_feature_map()
         if self.center:
-            pos = self._get_center()
-            # left, top, right, bottom
-            l, t = pos - self.view_radius
-            r, b = pos + self.view_radius
-            r += 1
-            b += 1
-            # clipped value
-            lc = max(l, 0)
-            tc = max(t, 0)
-            rc = min(r, self.grid_size[0])
-            bc = min(b, self.grid_size[1])
-            # offset
-            lo = lc - l
-            to = tc - t
-            ro = self.obs_size[0] - r + rc
-            bo = self.obs_size[1] - b + bc
-            self.obs_map.fill(0)
-            self.obs_map[lo:ro, to:bo] = self.feature_map[lc:rc, tc:bc]
+            x, y = self._get_center()
+            w, h = self.obs_size
+            self.obs_map = self.padded_map[x:x+w, y:y+h]
+        if self.obs_dtype == 'bits':
+            return np.packbits(self.obs_map, axis=-1)
         return self.obs_map
 
+    def _get_entity_array(self):
+        rows = [(pos.x, pos.y, ch, value, 1)
+                for pos, ch, value in self._get_entities()]
+        arr = self.entity_obs
+        arr[len(rows):] = 0
+        if rows:
+            arr[:len(rows)] = rows
+        return arr
+
+    def _alloc_image(self):
+        super()._alloc_image()
+        if self.center:
+            from PIL import Image, ImageDraw
+            # draw the whole map, the view is cropped from it
+            self.whole_image = Image.new('RGB', self.whole_size, 'black')
+            self.view_draw = self.draw
+            self.draw = ImageDraw.Draw(self.whole_image)
+
     def _render_env(self):
+        self._frame_stale = False
+        if self.renderer == 'numpy':
+            self._rasterize()
+            return
+        if self.image is None:
+            self._alloc_image()
         self._render_grid()
         if self.center:
             pos = self._get_center()
@@ -170,13 +584,161 @@ class GridEnv(BaseEnv):
             crop = self.whole_image.crop((lc, tc, r + 1, b + 1))
             self.image.paste(crop, box=(lc - l, tc - t))
 
-    def get_info(self):
-        obs = np.array(self.image.getdata()).reshape((*self.frame_size, 3))
+    def get_bitmap(self, out=None):
+        # e.g. after an obs cache hit, see get_info
+        if self._frame_stale:
+            self._render_env()
+        if self.renderer != 'numpy':
+            return super().get_bitmap(out)
+        # a view of the frame buffer, reused by the next step
+        arr = self.frame.reshape((*self.frame_size, 3))
+        if out is None:
+            return arr.astype(self.bitmap_dtype, copy=False)
+        np.copyto(out, arr, casting='unsafe')
+        return out
+
+    # numpy renderer
+    @classmethod
+    def get_tile(cls, shape, color, block_size):
+        '''
+        Return the read-only RGBA tile of a sprite, rasterized by PIL once
+        per (shape, color, block_size) and shared by all envs
+        '''
+        key = (shape, color, block_size)
+        if key not in cls._tile_cache:
+            from PIL import Image, ImageDraw, ImageColor
+            s = block_size
+            rect = (0, 0, s - 1, s - 1)
+            if isinstance(color, str):
+                color = ImageColor.getrgb(color)
+            fill = (*color[:3], 255)
+            tile = Image.new('RGBA', (s, s), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(tile)
+            if shape == 'ellipse':
+                draw.ellipse(rect, fill=fill)
+            elif shape == 'rect' or s == 1:
+                draw.rectangle(rect, fill=fill)
+            else:
+                draw.rectangle(rect, outline=fill)
+            arr = np.array(tile)
+            arr.flags.writeable = False
+            cls._tile_cache[key] = arr
+        return cls._tile_cache[key]
+
+    @classmethod
+    def get_atlas(cls, sprites, block_size):
+        '''
+        Return the read-only tiles of every combination of sprites, stacked
+        in drawing order on the background and indexed by the bit mask of
+        the combination
+        '''
+        key = (tuple(sprites), block_size)
+        if key not in cls._atlas_cache:
+            from PIL import ImageColor
+            s = block_size
+            tiles = [cls.get_tile(shape, color, s)
+                     for _, _, shape, color in sprites]
+            atlas = np.empty((1 << len(sprites), s, s, 3), dtype=np.uint8)
+            atlas[:] = ImageColor.getrgb('#333')
+            for code in range(len(atlas)):
+                for bit, tile in enumerate(tiles):
+                    if code >> bit & 1:
+                        mask = tile[:, :, 3] > 0
+                        atlas[code][mask] = tile[mask, :3]
+            atlas.flags.writeable = False
+            cls._atlas_cache[key] = atlas
+        return cls._atlas_cache[key]
+
+    def _configure_rasterizer(self):
+        s = self.block_size
+        w, h = self.grid_size
+        # tiles as s rows of s pixels, blitted row by row into the canvas
+        self.atlas = self.get_atlas(self.Sprites, s).reshape((-1, s, s * 3))
+        # pixel rows are y and columns are x, like np.array(self.image).
+        # The canvas has the black border of padded_map in center mode.
+        pw, ph = self.padded_map.shape[:2]
+        rx, ry = (pw - w) // 2, (ph - h) // 2
+        self.padded_canvas = np.zeros((ph * s, pw * s, 3), dtype=np.uint8)
+        self.canvas = self.padded_canvas[ry*s:(ry+h)*s, rx*s:(rx+w)*s]
+        self._canvas_rows = self.padded_canvas.reshape(
+            (ph, s, pw, s * 3))[ry:ry+h, :, rx:rx+w]
+        self._canvas_rows[:] = self.atlas[0][:, None, :]
+        # code of the tile in each cell of the canvas
+        self._canvas_code = np.zeros(self.grid_size, dtype=np.intp)
+        self._code = np.zeros(self.grid_size, dtype=np.intp)
+        # (channel, value or None for any, bit) of each sprite
+        self._sprite_bits = [(ch, value, 1 << bit) for bit, (ch, value, _, _)
+                             in enumerate(self.Sprites)]
+
+        self.frame = self.canvas
+
+    def _tile_codes(self):
+        '''
+        Return the (W, H) map of the tile codes, or-ing the bit of every
+        sprite drawn in a cell
+        '''
+        code = self._code
+        code.fill(0)
+        for ch, value, bit in self._sprite_bits:
+            layer = self.feature_map[:, :, ch]
+            match = layer > 0 if value is None else layer == value
+            np.bitwise_or(code, bit, out=code, where=match)
+        return code
+
+    def _cell_code(self, x, y):
+        values = self.feature_map[x, y].tolist()
+        code = 0
+        for ch, value, bit in self._sprite_bits:
+            v = values[ch]
+            if (v > 0 if value is None else v == value):
+                code |= bit
+        return code
+
+    def _rasterize(self):
+        # _update_feature_map clears the dirty cells
+        if self.incremental and not self._full_redraw:
+            dirty = set(tuple(pos) for pos in self._dirty_cells)
+            self._update_feature_map()
+            # blit the dirty cells whose tile changed
+            for x, y in dirty:
+                code = self._cell_code(x, y)
+                if code != self._canvas_code[x, y]:
+                    self._canvas_rows[y, :, x] = self.atlas[code]
+                    self._canvas_code[x, y] = code
+        else:
+            self._update_feature_map()
+            code = self._tile_codes()
+            # blit the cells whose tile changed since the last frame
+            xs, ys = np.nonzero(code != self._canvas_code)
+            if len(xs):
+                self._canvas_rows[ys, :, xs] = self.atlas[code[xs, ys]]
+                self._canvas_code[xs, ys] = code[xs, ys]
+
         if self.center:
-            mmap = np.array(self.whole_image.getdata())
-            mmap = mmap.reshape((*self.frame_size, 3))
+            s = self.block_size
+            x, y = self._get_center()
+            w, h = self.obs_size
+            self.frame = self.padded_canvas[y*s:(y+h)*s, x*s:(x+w)*s]
+
+    def get_info(self):
+        '''
+        Return the observed frame and the whole map as uint8 arrays laid out
+        like get_bitmap. The frames are only drawn here when the observations
+        are raw arrays. With the numpy renderer both are views of the frame
+        buffers, reused by the next step.
+        '''
+        if self._frame_stale:
+            self._render_env()
+        if self.renderer == 'numpy':
+            obs = self.frame.reshape((*self.frame_size, 3))
+            mmap = self.canvas.reshape((*self.whole_size, 3))
         else:
-            mmap = obs
+            obs = np.asarray(self.image).reshape((*self.frame_size, 3))
+            if self.center:
+                mmap = np.asarray(self.whole_image).reshape(
+                    (*self.whole_size, 3))
+            else:
+                mmap = obs
         return {
             'obs': obs,
             'map': mmap,
@@ -188,5 +750,31 @@ class GridEnv(BaseEnv):
     def _render_feature_map(self):
         raise NotImplementedError
 
+    def _render_cell(self, pos):
+        '''
+        Paint the entities at pos, the cell is cleared beforehand
+        '''
+        raise NotImplementedError
+
+    def _get_entities(self):
+        '''
+        Return (pos, channel, value) of the entities drawn in the feature
+        map, at most max_entities
+        '''
+        raise NotImplementedError
+
+    def _get_state(self):
+        '''
+        Return the logical state as a list of ints of fixed length
+        '''
+        raise NotImplementedError
+
+    def _set_state(self, values):
+        '''
+        Restore a list of _get_state and take_pos the cells of the entities
+        which block rand_free_pos
+        '''
+        raise NotImplementedError
+
     def _render_grid(self):
         raise NotImplementedError
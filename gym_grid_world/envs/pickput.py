@@ -31,6 +31,12 @@ class PickputEnv(GridEnv):
 
     metadata = {'render.modes': ['human']}
     reward_range = (-1., 6.)
+    Sprites = [
+        (1, None, 'rect', 'green'),
+        (2, None, 'outline', 'white'),
+        (0, 1, 'ellipse', (0, 255, 255, 0)),
+        (0, .5, 'ellipse', 'blue'),
+    ]
 
     def __init__(self):
         super().__init__()
@@ -40,7 +46,8 @@ class PickputEnv(GridEnv):
                   task_type=TaskType.pick, max_step=500, **kwargs):
         super().configure(action_types, grid_size, block_size,
                           n_features=4,
-                          max_step=max_step, **kwargs)
+                          max_step=max_step,
+                          max_entities=3, **kwargs)
         self.state = None
         self.first_pick = True
         self.task_type = task_type
@@ -73,10 +80,8 @@ class PickputEnv(GridEnv):
             return 0, False
         if act in Movesets:
             prev_pos = self.player_pos
-            self.player_pos += Movesets[act]
-
-            if not self.is_in_map(self.player_pos):
-                self.player_pos = prev_pos
+            self.player_pos = self.move(prev_pos, act)
+            self.touch(prev_pos, self.player_pos)
 
             # penalty
             if self.player_pos == prev_pos:
@@ -84,6 +89,7 @@ class PickputEnv(GridEnv):
 
         elif act == Action.pick and self.state == State.start:
             if self.obj_pos == self.player_pos:
+                self.touch(self.player_pos)
                 self.state = State.picked
                 if self.first_pick:
                     self.first_pick = False
@@ -91,6 +97,7 @@ class PickputEnv(GridEnv):
                 if (not self.task_type & TaskType.put):
                     self.state = State.end
         elif act == Action.put and self.state == State.picked:
+            self.touch(self.player_pos)
             if self.mark_pos == self.player_pos:
                 self.state = State.end
                 rew += 1
@@ -106,11 +113,25 @@ class PickputEnv(GridEnv):
 
         return rew, done
 
+    def _get_state(self):
+        # [player, obj or -1, mark or -1, state, first_pick]
+        def cell(pos):
+            return -1 if pos is None else self.cell_id(pos)
+        return [cell(self.player_pos), cell(self.obj_pos),
+                cell(self.mark_pos), int(self.state), int(self.first_pick)]
+
+    def _set_state(self, values):
+        def pos(cell):
+            return None if cell < 0 else self.cell_points[cell]
+        self.player_pos, self.obj_pos, self.mark_pos = map(pos, values[:3])
+        self.state = State(values[3])
+        self.first_pick = bool(values[4])
+
     def _get_center(self):
         return self.player_pos
 
     def _render_feature_map(self):
-        self.feature_map.fill(0)
+        self.feature_map[:, :, :-1] = 0
         feat_cnt = 0
 
         loc = tuple(self.player_pos)
@@ -132,11 +153,31 @@ class PickputEnv(GridEnv):
             self.feature_map[loc][feat_cnt] = 1
         feat_cnt += 1
 
-        self.feature_map[:, :, feat_cnt] = 1
+    def _get_entities(self):
+        entities = [(self.player_pos, 0,
+                     1 if self.state == State.picked else 0.5)]
+        if self.obj_pos and self.state == State.start:
+            entities.append((self.obj_pos, 1, 1))
+        if self.mark_pos:
+            entities.append((self.mark_pos, 2, 1))
+        return entities
+
+    def _render_cell(self, pos):
+        loc = tuple(pos)
+        if pos == self.player_pos:
+            if self.state == State.picked:
+                self.feature_map[loc][0] = 1
+            else:
+                self.feature_map[loc][0] = 0.5
+        if (self.obj_pos is not None and self.obj_pos == pos and
+                self.state == State.start):
+            self.feature_map[loc][1] = 1
+        if self.mark_pos is not None and self.mark_pos == pos:
+            self.feature_map[loc][2] = 1
 
     def _render_grid(self):
         # clear canvas
-        self.draw.rectangle((0, 0, *self.frame_size), fill='#333')
+        self.draw.rectangle((0, 0, *self.whole_size), fill='#333')
 
         # draw obj
         if self.obj_pos and self.state == State.start:
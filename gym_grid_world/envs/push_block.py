@@ -24,22 +24,36 @@ class PushBlockEnv(GridEnv):
 
     metadata = {'render.modes': ['human']}
     reward_range = (-1., 5.)
+    Sprites = [
+        (0, None, 'ellipse', 'blue'),
+        (1, None, 'rect', 'green'),
+        (2, None, 'outline', 'white'),
+    ]
 
     def __init__(self):
         super().__init__()
         self._is_configured = False
 
     def configure(self, grid_size=(10, 10), block_size=5,
-                  max_step=200, obj_n=1, **kwargs):
+                  max_step=200, obj_n=1, level_bank=None, **kwargs):
+        '''
+        level_bank: bank of solvable layouts (file or array, see
+            push_block_levels) to reset from instead of random layouts
+        '''
         super().configure(action_types, grid_size, block_size,
                           n_features=4,
-                          max_step=max_step, **kwargs)
+                          max_step=max_step,
+                          max_entities=1 + 2*obj_n, **kwargs)
         self.state = None
 
         self.player_pos = None
         self.obj_n = obj_n
         self.obj_set = None
         self.mark_set = None
+        self.levels = None
+        if level_bank is not None:
+            from .push_block_levels import load_levels
+            self.levels = load_levels(level_bank, grid_size, obj_n)
         self._is_configured = True
 
     def _init(self):
@@ -47,6 +61,10 @@ class PushBlockEnv(GridEnv):
             self.configure()
 
         self.state = State.start
+        if self.levels is not None:
+            row = self.levels[self.np_random.randint(len(self.levels))]
+            self._set_state([State.start] + row.tolist())
+            return
 
         w, h = self.grid_size
         lb = set((0, x) for x in range(h))
@@ -71,24 +89,24 @@ class PushBlockEnv(GridEnv):
             return 0, False
         elif act in Movesets:
             prev_pos = self.player_pos
-            self.player_pos += Movesets[act]
-
-            x, y = self.player_pos
-            if not self.is_in_map(self.player_pos):
-                self.player_pos = prev_pos
+            self.player_pos = self.move(prev_pos, act)
 
             if self.player_pos in self.obj_set:
-                new_obj_pos = self.player_pos + Movesets[act]
-                if (self.is_in_map(new_obj_pos) and
+                # the obj stays in place when pushed into the wall
+                new_obj_pos = self.move(self.player_pos, act)
+                if (new_obj_pos != self.player_pos and
                         not new_obj_pos in self.obj_set):
                     self.obj_set.remove(self.player_pos)
                     self.obj_set.add(new_obj_pos)
+                    self.touch(new_obj_pos)
                 else:
                     self.player_pos = prev_pos
 
             if self.obj_set == self.mark_set:
                 self.state = State.end
 
+            self.touch(prev_pos, self.player_pos)
+
             # penalty
             if self.player_pos == prev_pos:
                 rew -= 1
@@ -100,11 +118,24 @@ class PushBlockEnv(GridEnv):
 
         return rew, done
 
+    def _get_state(self):
+        # [state, player, obj cells, mark cells]
+        return ([int(self.state), self.cell_id(self.player_pos)] +
+                sorted(self.cell_id(pos) for pos in self.obj_set) +
+                sorted(self.cell_id(pos) for pos in self.mark_set))
+
+    def _set_state(self, values):
+        self.state = State(values[0])
+        self.player_pos = self.cell_points[values[1]]
+        objs, marks = values[2:2+self.obj_n], values[2+self.obj_n:]
+        self.obj_set = set(self.cell_points[cell] for cell in objs)
+        self.mark_set = set(self.cell_points[cell] for cell in marks)
+
     def _get_center(self):
         return self.player_pos
 
     def _render_feature_map(self):
-        self.feature_map.fill(0)
+        self.feature_map[:, :, :-1] = 0
         feat_cnt = 0
 
         loc = tuple(self.player_pos)
@@ -123,11 +154,23 @@ class PushBlockEnv(GridEnv):
             self.feature_map[loc][feat_cnt] = 1
         feat_cnt += 1
 
-        self.feature_map[:, :, feat_cnt] = 1
+    def _get_entities(self):
+        return ([(self.player_pos, 0, 1)] +
+                [(pos, 1, 1) for pos in self.obj_set] +
+                [(pos, 2, 1) for pos in self.mark_set])
+
+    def _render_cell(self, pos):
+        loc = tuple(pos)
+        if pos == self.player_pos:
+            self.feature_map[loc][0] = 1
+        if pos in self.obj_set:
+            self.feature_map[loc][1] = 1
+        if pos in self.mark_set:
+            self.feature_map[loc][2] = 1
 
     def _render_grid(self):
         # clear canvas
-        self.draw.rectangle((0, 0, *self.frame_size), fill='#333')
+        self.draw.rectangle((0, 0, *self.whole_size), fill='#333')
 
         # draw player
         loc = self.get_frame_rect(self.player_pos)
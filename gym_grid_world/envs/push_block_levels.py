@@ -0,0 +1,128 @@
+'''
+Banks of solvable PushBlock layouts
+
+    python -m gym_grid_world.envs.push_block_levels levels.npy \
+        --grid-size 10 10 --obj-n 2 -n 100000
+
+A bank is an int array saved with np.save. The first row is the header
+(width, height, obj_n, 0...) and every other row a layout
+[player, obj cells, mark cells] in cell ids (x * height + y), with the
+cells of the objects and of the marks sorted. Load it with load_levels and
+pass it to PushBlockEnv.configure(level_bank=...) or to the batched env.
+'''
+import argparse
+import os
+
+import numpy as np
+
+from .grid import get_next_cell
+from .push_block import Action, action_types
+
+# the move which undoes each move
+_reverse = np.array([Action.stay, Action.down, Action.up, Action.right,
+                     Action.left])
+_moves = np.array([Action.up, Action.down, Action.left, Action.right])
+
+
+def generate_levels(grid_size, obj_n, n, *, walk_len=None, pull_prob=.5,
+                    seed=None):
+    '''
+    Return n layouts of shape (n, 1 + 2 * obj_n), solvable by construction.
+
+    Every layout starts solved, with the objects on the marks, and the
+    player walks backwards for walk_len random moves, pulling the object
+    in front of it with pull_prob. Each backward move undoes a forward move
+    or push, so the walk reversed solves the layout. Layouts which end
+    solved, or with the player on a mark, are dropped and regenerated.
+    '''
+    rng = np.random.RandomState(seed)
+    w, h = grid_size
+    cell_n = w * h
+    if cell_n < 2 * obj_n + 1:
+        raise ValueError('%dx%d map too small for %d objects'
+                         % (w, h, obj_n))
+    if walk_len is None:
+        walk_len = 4 * cell_n
+    next_cell = get_next_cell(tuple(grid_size), tuple(action_types))
+
+    levels = []
+    left = n
+    while left > 0:
+        batch = max(left, 64)
+        idx = np.arange(batch)
+        keys = rng.random_sample((batch, cell_n))
+        cells = np.argpartition(keys, obj_n, axis=1)[:, :obj_n + 1]
+        player = cells[:, 0].copy()
+        marks = cells[:, 1:]
+        obj_grid = np.zeros((batch, cell_n), dtype=bool)
+        obj_grid[idx[:, None], marks] = True
+
+        for _ in range(walk_len):
+            act = _moves[rng.randint(len(_moves), size=batch)]
+            # the player came from target, the object in front of it came
+            # from the cell of the player
+            target = next_cell[player, _reverse[act]]
+            front = next_cell[player, act]
+            ok = (target != player) & ~obj_grid[idx, target]
+            pull = (ok & (front != player) & obj_grid[idx, front] &
+                    (rng.random_sample(batch) < pull_prob))
+            pull_idx = np.flatnonzero(pull)
+            obj_grid[pull_idx, front[pull_idx]] = False
+            obj_grid[pull_idx, player[pull_idx]] = True
+            player = np.where(ok, target, player)
+
+        mark_grid = np.zeros((batch, cell_n), dtype=bool)
+        mark_grid[idx[:, None], marks] = True
+        solved = (obj_grid == mark_grid).all(axis=1)
+        valid = ~solved & ~mark_grid[idx, player]
+        objs = np.nonzero(obj_grid)[1].reshape((batch, obj_n))
+        rows = np.concatenate([player[:, None], objs, np.sort(marks, axis=1)],
+                              axis=1)
+        levels.append(rows[valid][:left])
+        left -= len(levels[-1])
+
+    dtype = np.int16 if cell_n <= np.iinfo(np.int16).max else np.int32
+    return np.concatenate(levels).astype(dtype)
+
+
+def save_levels(path, grid_size, obj_n, levels):
+    header = np.zeros((1, levels.shape[1]), dtype=levels.dtype)
+    header[0, :3] = (*grid_size, obj_n)
+    np.save(path, np.concatenate([header, levels]))
+
+
+def load_levels(bank, grid_size=None, obj_n=None):
+    '''
+    Return the layouts of a bank, given as a file (memory mapped, read
+    only) or as an array with the header, checking the header against
+    grid_size and obj_n when given
+    '''
+    if isinstance(bank, (str, os.PathLike)):
+        bank = np.load(bank, mmap_mode='r')
+    w, h, n = bank[0, :3].tolist()
+    if grid_size is not None and tuple(grid_size) != (w, h):
+        raise ValueError('levels of a %dx%d map, not %dx%d'
+                         % (w, h, *grid_size))
+    if obj_n is not None and obj_n != n:
+        raise ValueError('levels with %d objects, not %d' % (n, obj_n))
+    return bank[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a bank of solvable PushBlock layouts')
+    parser.add_argument('path')
+    parser.add_argument('--grid-size', type=int, nargs=2, default=(10, 10))
+    parser.add_argument('--obj-n', type=int, default=1)
+    parser.add_argument('-n', type=int, default=100000)
+    parser.add_argument('--walk-len', type=int)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    levels = generate_levels(tuple(args.grid_size), args.obj_n, args.n,
+                             walk_len=args.walk_len, seed=args.seed)
+    save_levels(args.path, args.grid_size, args.obj_n, levels)
+
+
+if __name__ == '__main__':
+    main()
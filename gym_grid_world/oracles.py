@@ -0,0 +1,223 @@
+'''
+Expert policies for demonstrations
+
+The oracles read the logical state of get_state, so they work the same on a
+scalar env, a batched env or a SubprocVecEnv:
+
+    oracle = PickputOracle(grid_size)
+    action = oracle(env)            # an int for a scalar env
+    actions = oracle(batch_env)     # an int array of num_envs actions
+'''
+import heapq
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
+
+from .envs.grid import get_next_cell
+from .envs.pickput import Action as PickputAction, State as PickputState
+from .envs.pickput import action_types as pickput_actions
+from .envs.push_block import Action as PushBlockAction
+from .envs.push_block import action_types as push_block_actions
+from .envs.eat_bullet import EatBulletEnv
+
+
+@lru_cache(maxsize=None)
+def get_distance_tables(grid_size: Tuple[int, int],
+                        actions: Tuple[str, ...]):
+    '''
+    Return the read-only tables (dist, first_move) of shape
+    (cell_n, cell_n): the number of moves from a cell to another and the
+    action of the first move of a shortest path, stay when they are equal.
+    The maps have no walls, so every path of moves toward the target is a
+    shortest one.
+    '''
+    w, h = grid_size
+    x, y = np.divmod(np.arange(w * h), h)
+    dx = x[None, :] - x[:, None]
+    dy = y[None, :] - y[:, None]
+    dist = (np.abs(dx) + np.abs(dy)).astype(np.int16)
+
+    act = {name: i for i, name in enumerate(actions)}
+    first_move = np.full(dist.shape, act['stay'], dtype=np.int8)
+    first_move[dy < 0] = act['up']
+    first_move[dy > 0] = act['down']
+    first_move[dx < 0] = act['left']
+    first_move[dx > 0] = act['right']
+
+    dist.flags.writeable = False
+    first_move.flags.writeable = False
+    return dist, first_move
+
+
+def get_states(env):
+    '''
+    Return the state rows of a scalar env, a batched env or a SubprocVecEnv
+    '''
+    if hasattr(env, 'call'):
+        return np.stack(env.call('get_state'))
+    return np.atleast_2d(env.get_state())
+
+
+class Oracle:
+    '''
+    Abstract class of the expert policies
+    '''
+    def __call__(self, env):
+        actions = self.act(get_states(env))
+        if hasattr(env, 'num_envs'):
+            return actions
+        return int(actions[0])
+
+    # should be implemented
+    def act(self, states):
+        '''
+        Return the actions of the state rows (N, state size) of get_state
+        '''
+        raise NotImplementedError
+
+
+class PickputOracle(Oracle):
+    '''
+    Walk to the obj and pick it, then walk to the mark and put it
+    '''
+    def __init__(self, grid_size=(10, 10)):
+        self.dist, self.first_move = get_distance_tables(
+            tuple(grid_size), tuple(pickput_actions))
+
+    def act(self, states):
+        # [player, obj or -1, mark or -1, state, first_pick]
+        player, obj, mark, state = states[:, 2:6].T
+        picked = state == PickputState.picked
+        target = np.where(picked, mark, obj)
+        actions = self.first_move[player, target].astype(np.intp)
+        arrived = target == player
+        actions[arrived & ~picked] = PickputAction.pick
+        actions[arrived & picked] = PickputAction.put
+        return actions
+
+
+class EatBulletOracle(Oracle):
+    '''
+    Walk to the nearest food, for EatBulletEnv and EatBulletMemEnv
+    '''
+    def __init__(self, grid_size=(10, 10)):
+        self.dist, self.first_move = get_distance_tables(
+            tuple(grid_size), tuple(EatBulletEnv.ActionNames))
+
+    def act(self, states):
+        # [player, food cells]
+        player = states[:, 2]
+        foods = states[:, 3:]
+        nearest = np.argmin(self.dist[player[:, None], foods], axis=1)
+        target = foods[np.arange(len(states)), nearest]
+        return self.first_move[player, target].astype(np.intp)
+
+
+class EatBulletPairOracle(EatBulletOracle):
+    '''
+    Walk to the nearest food, of the other type than the last eaten one
+    when there is one
+    '''
+    def act(self, states):
+        # [player, last_eaten_type or -1, food cells, food types]
+        n = (states.shape[1] - 4) // 2
+        player, last = states[:, 2], states[:, 3]
+        foods, types = states[:, 4:4+n], states[:, 4+n:]
+        dist = self.dist[player[:, None], foods].astype(np.int32)
+        dist[(last[:, None] >= 0) & (types == last[:, None])] += \
+            np.iinfo(np.int16).max
+        nearest = np.argmin(dist, axis=1)
+        target = foods[np.arange(len(states)), nearest]
+        return self.first_move[player, target].astype(np.intp)
+
+
+class PushBlockOracle(Oracle):
+    '''
+    Follow a shortest solution found by A* over (player, objs) states.
+
+    The action of every state on a found solution is memoized, so following
+    the oracle searches once per level. Layouts without a solution within
+    max_nodes expanded states get stay.
+    '''
+    def __init__(self, grid_size=(10, 10), max_nodes=200000,
+                 memo_size=1 << 20):
+        grid_size = tuple(grid_size)
+        self.next_cell = get_next_cell(
+            grid_size, tuple(push_block_actions)).tolist()
+        self.dist = get_distance_tables(
+            grid_size, tuple(push_block_actions))[0].tolist()
+        w, h = grid_size
+        # objs pushed into a corner never move again
+        self.corners = {0, h - 1, (w - 1) * h, w * h - 1}
+        self.moves = [PushBlockAction.up, PushBlockAction.down,
+                      PushBlockAction.left, PushBlockAction.right]
+        self.max_nodes = max_nodes
+        self.memo_size = memo_size
+        self.memo = OrderedDict()
+
+    def act(self, states):
+        # [state, player, obj cells, mark cells]
+        obj_n = (states.shape[1] - 4) // 2
+        actions = np.empty(len(states), dtype=np.intp)
+        for i, row in enumerate(states[:, 3:].tolist()):
+            player = row[0]
+            objs = tuple(row[1:1+obj_n])
+            marks = tuple(row[1+obj_n:])
+            key = (player, objs, marks)
+            if key not in self.memo:
+                self._search(player, objs, marks)
+            actions[i] = self.memo[key]
+            self.memo.move_to_end(key)
+        return actions
+
+    def _heuristic(self, objs, marks):
+        # every obj needs at least its distance to a mark in pushes
+        return sum(min(self.dist[obj][mark] for mark in marks)
+                   for obj in objs)
+
+    def _memoize(self, key, action):
+        self.memo[key] = action
+        if len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+
+    def _search(self, player, objs, marks):
+        next_cell, corners = self.next_cell, self.corners
+        goal = frozenset(marks)
+        start = (player, objs)
+        parents = {start: None}
+        cnt = 0
+        heap = [(self._heuristic(objs, marks), 0, cnt, start)]
+        while heap and len(parents) < self.max_nodes:
+            _, g, _, node = heapq.heappop(heap)
+            player, objs = node
+            for act in self.moves:
+                new_pos = next_cell[player][act]
+                if new_pos == player:
+                    continue
+                new_objs = objs
+                if new_pos in objs:
+                    target = next_cell[new_pos][act]
+                    if (target == new_pos or target in objs or
+                            (target in corners and target not in goal)):
+                        continue
+                    new_objs = tuple(sorted(
+                        target if obj == new_pos else obj for obj in objs))
+                child = (new_pos, new_objs)
+                if child in parents:
+                    continue
+                parents[child] = (node, act)
+                if frozenset(new_objs) == goal:
+                    self._memoize_path(parents, child, marks)
+                    return
+                cnt += 1
+                heapq.heappush(heap, (g + 1 + self._heuristic(new_objs, marks),
+                                      g + 1, cnt, child))
+        # unsolvable, or too large to solve
+        self._memoize((*start, marks), PushBlockAction.stay)
+
+    def _memoize_path(self, parents, node, marks):
+        while parents[node] is not None:
+            node, act = parents[node]
+            self._memoize((*node, marks), act)
@@ -0,0 +1,101 @@
+import numpy as np
+
+import gym
+from gym import spaces
+
+
+def _stack_space(space, k):
+    low = np.repeat(space.low[None], k, axis=0)
+    high = np.repeat(space.high[None], k, axis=0)
+    return spaces.Box(low, high, dtype=space.dtype)
+
+
+class FrameStack(gym.Wrapper):
+    '''
+    Observe the last k observations stacked on a new first axis, oldest
+    first, for raw feature maps as well as RGB frames.
+
+    Every observation is written twice into a ring buffer of 2k slots, so
+    the last k are always a contiguous slice of it: the env renders into
+    the buffer (with step(out=)) and the returned stack is a view, reused
+    by the next step. Pass out= to get a copy instead.
+    '''
+    def __init__(self, env, k: int):
+        super().__init__(env)
+        self.k = k
+        self._configure()
+
+    def _configure(self):
+        space = self.env.observation_space
+        self.observation_space = _stack_space(space, self.k)
+        self.buffer = np.zeros((2 * self.k, *space.shape), dtype=space.dtype)
+        self.pos = 0
+
+    def _stack(self, out):
+        stack = self.buffer[self.pos + 1:self.pos + self.k + 1]
+        if out is None:
+            return stack
+        np.copyto(out, stack, casting='unsafe')
+        return out
+
+    def reset(self, out=None, **kwargs):
+        # configure may change the observation space, e.g. center
+        if self.buffer.shape[1:] != self.env.observation_space.shape:
+            self._configure()
+        self.pos = self.k - 1
+        self.env.reset(out=self.buffer[0], **kwargs)
+        self.buffer[1:] = self.buffer[0]
+        return self._stack(out)
+
+    def step(self, action, out=None):
+        self.pos = (self.pos + 1) % self.k
+        _, rew, done, info = self.env.step(action,
+                                           out=self.buffer[self.pos + self.k])
+        self.buffer[self.pos] = self.buffer[self.pos + self.k]
+        return self._stack(out), rew, done, info
+
+
+class BatchFrameStack:
+    '''
+    FrameStack for the batched envs and SubprocVecEnv, observations have
+    the shape (num_envs, k, ...). The history of an env finished inside
+    step is restarted from the first observation of its new game.
+    '''
+    def __init__(self, env, k: int):
+        self.env = env
+        self.k = k
+        self.num_envs = env.num_envs
+        self.buffer = None
+        self.pos = 0
+
+    def __getattr__(self, name):
+        return getattr(self.env, name)
+
+    def _configure(self):
+        space = self.env.observation_space
+        self.observation_space = _stack_space(space, self.k)
+        self.buffer = np.zeros((self.num_envs, 2 * self.k, *space.shape),
+                               dtype=space.dtype)
+
+    def _stack(self):
+        return self.buffer[:, self.pos + 1:self.pos + self.k + 1]
+
+    def reset(self):
+        obs = self.env.reset()
+        # the batched envs know their observation space after reset
+        if (self.buffer is None or
+                self.buffer.shape[2:] != self.env.observation_space.shape):
+            self._configure()
+        self.pos = self.k - 1
+        self.buffer[:] = obs[:, None]
+        return self._stack()
+
+    def step(self, actions):
+        obs, rews, dones, info = self.env.step(actions)
+        self.pos = (self.pos + 1) % self.k
+        self.buffer[:, self.pos] = obs
+        self.buffer[:, self.pos + self.k] = obs
+        if dones.any():
+            idx = np.flatnonzero(dones)
+            self.buffer[idx] = obs[idx, None]
+        return self._stack(), rews, dones, info
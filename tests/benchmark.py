@@ -1,35 +1,231 @@
+'''
+Benchmark suite for the grid worlds
+
+    python tests/benchmark.py -o new.json
+    python tests/benchmark.py --quick -o new.json
+    python tests/benchmark.py --compare old.json new.json
+
+Every case runs one configuration with random actions and reports env steps
+per second, p50/p99 latency of a step call, the mean cost of a reset and the
+peak memory allocated by a short run (tracemalloc, measured in a separate
+pass so it does not slow down the timings).
+'''
+import argparse
+import itertools
+import json
+import platform
+import sys
 import time
+import tracemalloc
+
 import numpy as np
 import gym
-import gym_grid_world
-from gym_grid_world.envs.pickput import TaskType
-
-env = gym.make('eatbullet2d-v0')
-env.configure(center=True, view_radius=(5, 5))
-
-act_map = { 81: 3, 82: 1, 83: 4, 84: 2 }
-
-cnt = 0
-total_rew = 0
-obs = env.reset()
-
-avg = 0
-
-while True:
-    try:
-        act = env.action_space.sample()
-        st = time.time()
-        obs, rew, done, _ = env.step(act)
-        delta = time.time() - st
-        total_rew += rew
-        print(total_rew, cnt, done, delta)
-        avg += delta
-        cnt += 1
-
-        if done:
-            break
-    except KeyboardInterrupt:
-        break
-
-avg /= cnt
-print(avg)
+
+import gym_grid_world  # noqa: F401
+from gym_grid_world.batch import (EatBulletBatchEnv, EatBulletMemBatchEnv,
+                                  PickputBatchEnv, PushBlockBatchEnv)
+
+ENV_IDS = ['eatbullet2d-v0', 'eatbulletmem2d-v0', 'eatbulletpair2d-v0',
+           'pickput2d-v0', 'pushblock2d-v0']
+BATCH_ENVS = {
+    'eatbullet2d-v0': EatBulletBatchEnv,
+    'eatbulletmem2d-v0': EatBulletMemBatchEnv,
+    'pickput2d-v0': PickputBatchEnv,
+    'pushblock2d-v0': PushBlockBatchEnv,
+}
+VIEW_RADIUS = (5, 5)
+# fields which identify a case in the JSON output
+CASE_KEYS = ('env_id', 'mode', 'obs', 'center', 'grid_size', 'block_size',
+             'renderer', 'incremental', 'num_envs')
+
+
+def make_cases(quick=False):
+    grid_sizes = [(10, 10)] if quick else [(10, 10), (32, 32)]
+    block_sizes = [5] if quick else [1, 5]
+    for env_id, grid_size, center in itertools.product(
+            ENV_IDS, grid_sizes, (False, True)):
+        base = dict(env_id=env_id, center=center, grid_size=grid_size)
+        yield dict(base, mode='scalar', obs='raw', block_size=None,
+                   renderer=None, incremental=False, num_envs=1)
+        for block_size, renderer, incremental in itertools.product(
+                block_sizes, ('pil', 'numpy'), (False, True)):
+            yield dict(base, mode='scalar', obs='rgb', block_size=block_size,
+                       renderer=renderer, incremental=incremental, num_envs=1)
+        if env_id in BATCH_ENVS:
+            yield dict(base, mode='batch', obs='raw', block_size=None,
+                       renderer=None, incremental=False, num_envs=256)
+
+
+def make_env(case, seed=0):
+    kwargs = dict(grid_size=case['grid_size'])
+    if case['center']:
+        kwargs.update(center=True, view_radius=VIEW_RADIUS)
+    if case['mode'] == 'batch':
+        env = BATCH_ENVS[case['env_id']](case['num_envs'])
+    else:
+        env = gym.make(case['env_id']).unwrapped
+        if case['obs'] == 'raw':
+            kwargs.update(raw_array=True)
+        else:
+            kwargs.update(block_size=case['block_size'],
+                          renderer=case['renderer'],
+                          incremental=case['incremental'], obs_dtype='uint8')
+    env.seed(seed)
+    env.configure(**kwargs)
+    return env
+
+
+def run_steps(env, case, steps, rng, timings=None):
+    n = env.action_space.n
+    if case['mode'] == 'batch':
+        actions = rng.randint(n, size=(steps, case['num_envs']))
+    else:
+        actions = rng.randint(n, size=steps)
+    env.reset()
+    for act in actions:
+        st = time.perf_counter()
+        _, _, done, _ = env.step(act)
+        if timings is not None:
+            timings.append(time.perf_counter() - st)
+        # the batched envs reset finished games inside step
+        if case['mode'] == 'scalar' and done:
+            env.reset()
+
+
+def bench_case(case, steps, resets):
+    rng = np.random.RandomState(0)
+    env = make_env(case)
+
+    # warm up the caches (tiles, atlases, next cell tables)
+    run_steps(env, case, min(steps, 100), rng)
+
+    timings = []
+    st = time.perf_counter()
+    run_steps(env, case, steps, rng, timings)
+    total = time.perf_counter() - st
+    timings = np.array(timings)
+
+    st = time.perf_counter()
+    for _ in range(resets):
+        env.reset()
+    reset_cost = (time.perf_counter() - st) / resets
+
+    tracemalloc.start()
+    mem_env = make_env(case)
+    run_steps(mem_env, case, min(steps, 200), rng)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = dict(case)
+    result.update(
+        steps_per_sec=steps * case['num_envs'] / total,
+        p50_us=float(np.percentile(timings, 50)) * 1e6,
+        p99_us=float(np.percentile(timings, 99)) * 1e6,
+        reset_us=reset_cost * 1e6,
+        peak_kb=peak / 1024,
+    )
+    return result
+
+
+def run(args):
+    results = []
+    for case in make_cases(args.quick):
+        if args.env and case['env_id'] not in args.env:
+            continue
+        steps = args.steps if case['mode'] == 'scalar' else args.batch_steps
+        result = bench_case(case, steps, args.resets)
+        results.append(result)
+        print('%-20s %-6s %-3s center=%-5s grid=%-8s block=%-4s %-5s '
+              'inc=%-5s %12.0f steps/s  p50 %8.1fus  p99 %8.1fus  reset %8.1fus  '
+              'peak %8.1fKB' % (
+                  case['env_id'], case['mode'], case['obs'], case['center'],
+                  '%dx%d' % case['grid_size'], case['block_size'],
+                  case['renderer'], case['incremental'],
+                  result['steps_per_sec'],
+                  result['p50_us'], result['p99_us'], result['reset_us'],
+                  result['peak_kb']),
+              file=sys.stderr)
+
+    report = dict(
+        meta=dict(python=platform.python_version(),
+                  numpy=np.__version__,
+                  gym=gym.__version__,
+                  platform=platform.platform(),
+                  steps=args.steps,
+                  batch_steps=args.batch_steps,
+                  resets=args.resets),
+        results=results,
+    )
+    text = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+def case_key(result):
+    # reports older than the incremental key ran without it
+    return tuple(tuple(v) if isinstance(v, list) else v
+                 for v in (result.get(k, False) for k in CASE_KEYS))
+
+
+def compare(old_path, new_path, threshold):
+    '''
+    Print the relative change of every case in both runs and return the
+    number of regressions beyond threshold
+    '''
+    with open(old_path) as f:
+        old = {case_key(r): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = {case_key(r): r for r in json.load(f)['results']}
+
+    # (metric, higher is better)
+    metrics = [('steps_per_sec', True), ('p99_us', False),
+               ('reset_us', False), ('peak_kb', False)]
+    regressions = 0
+    for key in sorted(old.keys() & new.keys(), key=str):
+        changes = []
+        for name, higher_better in metrics:
+            a, b = old[key][name], new[key][name]
+            change = (b - a) / a if a else 0.
+            worse = -change if higher_better else change
+            flag = ''
+            if worse > threshold:
+                flag = ' REGRESSION'
+                regressions += 1
+            changes.append('%s %+.1f%%%s' % (name, change * 100, flag))
+        print('%s: %s' % (dict(zip(CASE_KEYS, key)), ', '.join(changes)))
+    for key in old.keys() - new.keys():
+        print('missing in new run: %s' % dict(zip(CASE_KEYS, key)))
+    print('%d regressions (threshold %.0f%%)' % (regressions,
+                                                  threshold * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', help='write the JSON report here')
+    parser.add_argument('--quick', action='store_true',
+                        help='one grid size and block size')
+    parser.add_argument('--env', action='append',
+                        help='only run this env id (repeatable)')
+    parser.add_argument('--steps', type=int, default=2000,
+                        help='steps per scalar case')
+    parser.add_argument('--batch-steps', type=int, default=200,
+                        help='steps per batched case')
+    parser.add_argument('--resets', type=int, default=100)
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two JSON reports instead of running')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown flagged as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()